@@ -1,8 +1,14 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, Response, request, jsonify, send_file
 from flask_cors import CORS
+from flask_compress import Compress
 import os
 import sys
 import tempfile
+import json
+import math
+import time
+import threading
+from collections import OrderedDict
 from datetime import datetime
 
 # Add parent directory to path to import existing modules
@@ -15,87 +21,210 @@ from supabase_client import (
     download_resume_from_supabase,
     upload_resume_bytes_to_supabase
 )
-from langgraph_pipeline import create_resume_graph
+from langgraph_pipeline import (
+    create_resume_graph,
+    embedding_model,
+    router,
+    resilient_tiers,
+    schedulers,
+    parse_stats
+)
+from llm_scheduler import llm_priority, INTERACTIVE, BATCH
+from document_parsing import PARSE_MAX_BYTES
+from listing_cache import listing_cache, cached_json_body, etag_matches
+from scan_store import save_scan, load_scan
+from scoring import rerank, validate_weights
+from profiling import maybe_profile, profile_path, profile_access_allowed
+
+api = Blueprint('api', __name__)
+
+DEFAULT_SKILLS = ["python", "machine learning", "communication"]
 
-app = Flask(__name__)
-CORS(app)
+# Compiled graphs keyed by their configuration. Compiling is not free and
+# the compiled graph is safe to reuse across requests. Skills, threshold and
+# weights come from clients, so only the most recently used are kept.
+GRAPH_CACHE_SIZE = int(os.getenv("GRAPH_CACHE_SIZE", "32"))
+_graph_cache = OrderedDict()
+_graph_cache_lock = threading.Lock()
 
-# Create the evaluation graph once (reused for all requests)
-evaluation_graph = None
+# Set once models are loaded and default graphs compiled (see preload_models)
+_ready = threading.Event()
+_warmup_thread = None
+_warmup_lock = threading.Lock()
 
-def get_evaluation_graph(skills=None, job_description=None):
+
+def get_evaluation_graph(skills=None, job_description=None, similarity_threshold=None, weights=None):
     """Get or create the evaluation graph with specified parameters."""
-    global evaluation_graph
     if skills is None:
-        skills = ["python", "machine learning", "communication"]
+        skills = DEFAULT_SKILLS
     
-    evaluation_graph = create_resume_graph(
-        skills=skills,
-        evaluate_experience=True,
-        evaluate_culture=True,
-        evaluate_jd=bool(job_description)
-    )
-    return evaluation_graph
+    weights_key = tuple(sorted(weights.items())) if weights else None
+    key = (tuple(skills), bool(job_description), similarity_threshold, weights_key)
+    with _graph_cache_lock:
+        graph = _graph_cache.get(key)
+        if graph is None:
+            graph = create_resume_graph(
+                skills=skills,
+                evaluate_experience=True,
+                evaluate_culture=True,
+                evaluate_jd=bool(job_description),
+                similarity_threshold=similarity_threshold,
+                agent_weights=weights
+            )
+            _graph_cache[key] = graph
+            while len(_graph_cache) > GRAPH_CACHE_SIZE:
+                _graph_cache.popitem(last=False)
+        else:
+            _graph_cache.move_to_end(key)
+    return graph
+
+
+def preload_models():
+    """
+    Warm up the embedding model and compile the default graphs.
+
+    Under gunicorn with preload_app this runs once in the master before
+    workers fork, so the loaded weights and compiled graphs are shared
+    copy-on-write instead of being loaded again by every worker.
+    """
+    embedding_model.embed_query("warmup")
+    get_evaluation_graph(skills=DEFAULT_SKILLS, job_description="warmup")
+    get_evaluation_graph(skills=DEFAULT_SKILLS, job_description=None)
+    _ready.set()
+
+
+def warm_up_in_background():
+    """
+    Without preloading, each worker warms up on its own: the first readiness
+    probe starts preload_models() in a background thread (threads do not
+    survive a fork, so this cannot happen in create_app). A failed warm-up
+    is retried by the next probe.
+    """
+    global _warmup_thread
+    with _warmup_lock:
+        if _ready.is_set() or (_warmup_thread is not None and _warmup_thread.is_alive()):
+            return
+        _warmup_thread = threading.Thread(target=preload_models, name="warmup", daemon=True)
+        _warmup_thread.start()
+
+
+@api.app_errorhandler(413)
+def upload_too_large(e):
+    return jsonify({
+        "success": False,
+        "error": f"File too large. Limit is {PARSE_MAX_BYTES // (1024 * 1024)} MB."
+    }), 413
 
 
-@app.route('/api/health', methods=['GET'])
+@api.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({"status": "ok"})
 
 
-@app.route('/api/resumes', methods=['GET'])
+@api.route('/api/live', methods=['GET'])
+def liveness():
+    """Liveness probe: the process is up and serving requests."""
+    return jsonify({"status": "alive", "pid": os.getpid()})
+
+
+@api.route('/api/ready', methods=['GET'])
+def readiness():
+    """Readiness probe: models are loaded and default graphs compiled."""
+    if not _ready.is_set():
+        warm_up_in_background()
+        return jsonify({"status": "loading", "pid": os.getpid()}), 503
+    return jsonify({"status": "ready", "pid": os.getpid()})
+
+
+@api.route('/api/llm-stats', methods=['GET'])
+def llm_stats():
+    """Report LLM usage: call share and latency per model tier, retries, circuit state,
+    parse paths and scheduler queue depth / wait times."""
+    return jsonify({
+        "success": True,
+        "routing": router.stats(),
+        "resilience": {name: tier.stats() for name, tier in resilient_tiers.items()},
+        "parsing": parse_stats.snapshot(),
+        "scheduler": {name: scheduler.stats() for name, scheduler in schedulers.items()}
+    })
+
+
+def cached_listing_response(key, build_payload):
+    """
+    Serve a listing from the short-TTL cache with an ETag.
+    Answers 304 Not Modified when the client's If-None-Match still matches.
+    """
+    body, etag = cached_json_body(key, build_payload)
+
+    if etag_matches(request.if_none_match, etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Browsers keep the copy but revalidate it on every navigation
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@api.route('/api/resumes', methods=['GET'])
 def list_resumes():
     """List all resumes from Supabase storage."""
     try:
         folder = request.args.get('folder', '')
         
-        # Get list of files from Supabase
-        objects = list_resumes_in_supabase(folder=folder)
-        
-        resumes = []
-        for obj in objects:
-            name = obj.get('name', '')
-            if name and name.lower().endswith('.pdf'):
-                # Build full path
-                storage_path = f"{folder}/{name}" if folder else name
-                resumes.append({
-                    'name': name,
-                    'storage_path': storage_path,
-                    'created_at': obj.get('created_at', ''),
-                    'size': obj.get('metadata', {}).get('size', 0) if obj.get('metadata') else 0
-                })
+        def build_payload():
+            # Get list of files from Supabase
+            objects = list_resumes_in_supabase(folder=folder)
+            
+            resumes = []
+            for obj in objects:
+                name = obj.get('name', '')
+                if name and name.lower().endswith('.pdf'):
+                    # Build full path
+                    storage_path = f"{folder}/{name}" if folder else name
+                    resumes.append({
+                        'name': name,
+                        'storage_path': storage_path,
+                        'created_at': obj.get('created_at', ''),
+                        'size': obj.get('metadata', {}).get('size', 0) if obj.get('metadata') else 0
+                    })
+            
+            return {
+                "success": True,
+                "resumes": resumes,
+                "count": len(resumes)
+            }
         
-        return jsonify({
-            "success": True,
-            "resumes": resumes,
-            "count": len(resumes)
-        })
+        return cached_listing_response(('resumes', folder), build_payload)
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
-@app.route('/api/folders', methods=['GET'])
+@api.route('/api/folders', methods=['GET'])
 def list_folders():
     """List all date folders in Supabase storage."""
     try:
-        objects = supabase.storage.from_(SUPABASE_BUCKET).list(path="")
-        
-        folders = []
-        for obj in objects:
-            name = obj.get('name', '')
-            # Folders typically don't have file extensions
-            if name and '.' not in name:
-                folders.append(name)
+        def build_payload():
+            objects = supabase.storage.from_(SUPABASE_BUCKET).list(path="")
+            
+            folders = []
+            for obj in objects:
+                name = obj.get('name', '')
+                # Folders typically don't have file extensions
+                if name and '.' not in name:
+                    folders.append(name)
+            
+            return {
+                "success": True,
+                "folders": sorted(folders, reverse=True)
+            }
         
-        return jsonify({
-            "success": True,
-            "folders": sorted(folders, reverse=True)
-        })
+        return cached_listing_response(('folders',), build_payload)
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
-@app.route('/api/upload', methods=['POST'])
+@api.route('/api/upload', methods=['POST'])
 def upload_resume():
     """Upload a resume directly to Supabase."""
     try:
@@ -124,6 +253,9 @@ def upload_resume():
             folder=folder
         )
         
+        # New file (and possibly a new folder): drop cached listings
+        listing_cache.invalidate()
+        
         return jsonify({
             "success": True,
             "storage_path": storage_path,
@@ -133,7 +265,69 @@ def upload_resume():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
-@app.route('/api/scan', methods=['POST'])
+# Always returned so clients can identify each result
+SCAN_RESULT_KEYS = ("storage_path", "filename", "success", "error")
+
+
+def select_fields(results, fields):
+    """
+    Keep only the requested keys of each scan result.
+    fields: comma-separated string or list, e.g. "final_score,breakdown".
+    """
+    if not fields:
+        return results
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(',') if f.strip()]
+    wanted = set(fields) | set(SCAN_RESULT_KEYS)
+    return [{k: v for k, v in r.items() if k in wanted} for r in results]
+
+
+def parse_similarity_threshold(value):
+    """similarity_threshold from a JSON body or form field; None disables the gate."""
+    if value is None or value == '':
+        return None
+    try:
+        threshold = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"similarity_threshold must be a number, got {value!r}")
+    if not math.isfinite(threshold):
+        raise ValueError(f"similarity_threshold must be a finite number, got {value!r}")
+    return threshold
+
+
+def parse_pagination(data):
+    """
+    (page, page_size) from the JSON body or the query string; page_size is
+    None when not paginating. Raises ValueError on bad values.
+    """
+    page = data.get('page', request.args.get('page', 1))
+    page_size = data.get('page_size', request.args.get('page_size'))
+    try:
+        page = int(page)
+        page_size = int(page_size) if page_size else None
+    except (TypeError, ValueError):
+        raise ValueError("page and page_size must be integers")
+    if page < 1 or (page_size is not None and page_size < 1):
+        raise ValueError("page and page_size must be positive")
+    return page, page_size
+
+
+def results_page(results, page, page_size, fields):
+    """Response fields for one page of a ranked result list."""
+    response = {"total_scanned": len(results)}
+    if page_size:
+        start = (page - 1) * page_size
+        results = results[start:start + page_size]
+        response.update({
+            "page": page,
+            "page_size": page_size,
+            "total_pages": (response["total_scanned"] + page_size - 1) // page_size
+        })
+    response["results"] = select_fields(results, fields)
+    return response
+
+
+@api.route('/api/scan', methods=['POST'])
 def scan_resumes():
     """Scan one or more resumes and return evaluation results."""
     try:
@@ -141,72 +335,171 @@ def scan_resumes():
         storage_paths = data.get('storage_paths', [])
         job_description = data.get('job_description', 'Looking for a skilled professional.')
         skills = data.get('skills', ['python', 'machine learning', 'communication'])
+        similarity_threshold = data.get('similarity_threshold')
         
         if not storage_paths:
             return jsonify({"success": False, "error": "No resumes selected"}), 400
         
+        try:
+            weights = validate_weights(data.get('weights'))
+            similarity_threshold = parse_similarity_threshold(similarity_threshold)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        
+        # Optional fields= selector and pagination (body or query string),
+        # checked before any resume is scanned
+        fields = data.get('fields', request.args.get('fields'))
+        try:
+            page, page_size = parse_pagination(data)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        
         # Get evaluation graph
-        graph = get_evaluation_graph(skills=skills, job_description=job_description)
+        graph = get_evaluation_graph(
+            skills=skills,
+            job_description=job_description,
+            similarity_threshold=similarity_threshold,
+            weights=weights
+        )
         
         results = []
         
-        for storage_path in storage_paths:
-            try:
-                # Download resume to temp location
-                local_path = download_resume_from_supabase(
-                    storage_path,
-                    local_dir=tempfile.gettempdir()
-                )
-                
-                # Build initial state
-                initial_state = {
-                    "resume_path": local_path,
-                    "job_description": job_description,
-                    "skills_required": skills,
-                    "agent_outputs": {}
-                }
-                
-                # Run evaluation
-                result = graph.invoke(initial_state)
-                
-                final_score = result.get("final_score", 0)
-                breakdown = result.get("final_breakdown", {})
-                agent_outputs = result.get("agent_outputs", {})
-                
-                results.append({
-                    "storage_path": storage_path,
-                    "filename": os.path.basename(storage_path),
-                    "final_score": final_score,
-                    "breakdown": breakdown,
-                    "details": agent_outputs,
-                    "success": True
-                })
-                
-                # Cleanup temp file
-                if os.path.exists(local_path):
-                    os.remove(local_path)
+        # Opt-in profiling (X-Profile: 1 + X-Profile-Token); a no-op otherwise
+        with maybe_profile(request, 'scan') as profile:
+            for storage_path in storage_paths:
+                try:
+                    # Download resume to temp location
+                    local_path = download_resume_from_supabase(
+                        storage_path,
+                        local_dir=tempfile.gettempdir()
+                    )
+                    
+                    # Build initial state
+                    initial_state = {
+                        "resume_path": local_path,
+                        "job_description": job_description,
+                        "skills_required": skills,
+                        "agent_outputs": {}
+                    }
                     
-            except Exception as e:
-                results.append({
-                    "storage_path": storage_path,
-                    "filename": os.path.basename(storage_path),
-                    "error": str(e),
-                    "success": False
-                })
+                    # Run evaluation (batch priority: yields LLM quota to single uploads)
+                    with llm_priority(BATCH):
+                        config = profile.graph_config(label=storage_path) if profile else None
+                        result = graph.invoke(initial_state, config=config)
+                    
+                    final_score = result.get("final_score", 0)
+                    breakdown = result.get("final_breakdown", {})
+                    agent_outputs = result.get("agent_outputs", {})
+                    
+                    results.append({
+                        "storage_path": storage_path,
+                        "filename": os.path.basename(storage_path),
+                        "final_score": final_score,
+                        "breakdown": breakdown,
+                        "details": agent_outputs,
+                        "auto_filtered": result.get("auto_filtered", False),
+                        "success": True
+                    })
+                    
+                    # Cleanup temp file
+                    if os.path.exists(local_path):
+                        os.remove(local_path)
+                
+                except Exception as e:
+                    results.append({
+                        "storage_path": storage_path,
+                        "filename": os.path.basename(storage_path),
+                        "error": str(e),
+                        "success": False
+                    })
         
         # Sort by score
         results = sorted(results, key=lambda x: x.get('final_score', 0), reverse=True)
         
+        # Stored, so other pages come from /api/scans/<scan_id> without rescanning
+        scan_id = save_scan(results)
+        
+        response = {"success": True, "scan_id": scan_id}
+        response.update(results_page(results, page, page_size, fields))
+        if profile:
+            response["profile"] = profile.summary
+        return jsonify(response)
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@api.route('/api/scans/<scan_id>', methods=['GET'])
+def get_scan_results(scan_id):
+    """
+    Page through the stored results of an earlier /api/scan.
+    Query: page, page_size, fields (same meaning as for /api/scan).
+    """
+    try:
+        page, page_size = parse_pagination({})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    results = load_scan(scan_id)
+    if results is None:
+        return jsonify({"success": False, "error": "Scan not found or expired"}), 404
+    
+    response = {"success": True, "scan_id": scan_id}
+    response.update(results_page(results, page, page_size, request.args.get('fields')))
+    return jsonify(response)
+
+
+@api.route('/api/rerank', methods=['POST'])
+def rerank_results():
+    """
+    Re-rank stored scan results under new agent weights, without any LLM call.
+
+    Body: {"results": [{"storage_path": ..., "breakdown": {...}}, ...],
+           "weights": {"jd_match": 3, "culture_fit": 0.5}}
+    Each result may carry its scores as "breakdown" or "final_breakdown".
+    """
+    try:
+        data = request.json
+        candidates = data.get('results', [])
+        
+        if not candidates:
+            return jsonify({"success": False, "error": "No results to rerank"}), 400
+        
+        try:
+            weights = validate_weights(data.get('weights')) or {}
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        
+        start = time.perf_counter()
+        breakdowns = [c.get('breakdown') or c.get('final_breakdown') or {} for c in candidates]
+        # auto-filtered resumes were never evaluated: they stay at 0, ranked last
+        excluded = [bool(c.get('auto_filtered')) for c in candidates]
+        scores, order = rerank(breakdowns, weights, excluded=excluded)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        
+        ranked = []
+        for rank, i in enumerate(order, start=1):
+            candidate = candidates[i]
+            ranked.append({
+                "storage_path": candidate.get('storage_path'),
+                "filename": candidate.get('filename'),
+                "rank": rank,
+                "final_score": float(scores[i]),
+                "previous_score": candidate.get('final_score'),
+                "breakdown": breakdowns[i],
+                "auto_filtered": excluded[i]
+            })
+        
         return jsonify({
             "success": True,
-            "results": results,
-            "total_scanned": len(results)
+            "results": ranked,
+            "weights": weights,
+            "elapsed_ms": round(elapsed_ms, 3)
         })
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
-@app.route('/api/scan-upload', methods=['POST'])
+@api.route('/api/scan-upload', methods=['POST'])
 def scan_uploaded_resume():
     """Upload and immediately scan a resume."""
     try:
@@ -221,12 +514,27 @@ def scan_uploaded_resume():
         if not file.filename.lower().endswith('.pdf'):
             return jsonify({"success": False, "error": "Only PDF files are allowed"}), 400
         
+        try:
+            similarity_threshold = parse_similarity_threshold(request.form.get('similarity_threshold'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        
+        try:
+            weights = validate_weights(json.loads(request.form['weights'])) if request.form.get('weights') else None
+        except ValueError as e:
+            return jsonify({"success": False, "error": f"Invalid weights: {e}"}), 400
+        
         # Save to temp file
         temp_path = os.path.join(tempfile.gettempdir(), file.filename)
         file.save(temp_path)
         
         # Get evaluation graph
-        graph = get_evaluation_graph(skills=skills, job_description=job_description)
+        graph = get_evaluation_graph(
+            skills=skills,
+            job_description=job_description,
+            similarity_threshold=similarity_threshold,
+            weights=weights
+        )
         
         # Build initial state
         initial_state = {
@@ -236,8 +544,11 @@ def scan_uploaded_resume():
             "agent_outputs": {}
         }
         
-        # Run evaluation
-        result = graph.invoke(initial_state)
+        # Run evaluation ahead of any queued batch scans
+        # (profiled when the request asks for it: X-Profile: 1 + X-Profile-Token)
+        with maybe_profile(request, 'scan_upload') as profile, llm_priority(INTERACTIVE):
+            config = profile.graph_config(label=file.filename) if profile else None
+            result = graph.invoke(initial_state, config=config)
         
         final_score = result.get("final_score", 0)
         breakdown = result.get("final_breakdown", {})
@@ -247,17 +558,63 @@ def scan_uploaded_resume():
         if os.path.exists(temp_path):
             os.remove(temp_path)
         
-        return jsonify({
+        response = {
             "success": True,
             "filename": file.filename,
             "final_score": final_score,
             "breakdown": breakdown,
-            "details": agent_outputs
-        })
+            "details": agent_outputs,
+            "auto_filtered": result.get("auto_filtered", False)
+        }
+        if profile:
+            response["profile"] = profile.summary
+        return jsonify(response)
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@api.route('/api/profiles/<profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    """
+    Download a saved request profile (folded stacks for flamegraph tools, or ?format=json).
+    Needs the X-Profile-Token header, like profiling itself.
+    """
+    extension = 'json' if request.args.get('format') == 'json' else 'folded'
+    path = profile_path(profile_id, extension) if profile_access_allowed(request) else None
+    if path is None:
+        return jsonify({"success": False, "error": "Profile not found"}), 404
+    return send_file(path, mimetype='application/json' if extension == 'json' else 'text/plain',
+                     as_attachment=True, download_name=os.path.basename(path))
+
+
+def create_app(preload=True):
+    """
+    Application factory.
+
+    Dev server:  python app.py
+    Production:  gunicorn -c gunicorn.conf.py app:app   (from backend/)
+    """
+    app = Flask(__name__)
+    # Reject oversized uploads before they are read (plus room for form fields)
+    app.config['MAX_CONTENT_LENGTH'] = PARSE_MAX_BYTES + 64 * 1024
+    # gzip / brotli for JSON responses (scan results carry full agent details)
+    app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+    app.config['COMPRESS_MIMETYPES'] = ['application/json']
+    app.config['COMPRESS_MIN_SIZE'] = 500
+    CORS(app)
+    Compress(app)
+    app.register_blueprint(api)
+
+    if preload:
+        preload_models()
+    # otherwise every worker warms up when first probed (see warm_up_in_background)
+
+    return app
+
+
+app = create_app(preload=os.getenv("PRELOAD_MODELS", "1") == "1")
+
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
 
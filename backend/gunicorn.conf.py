@@ -0,0 +1,54 @@
+# gunicorn.conf.py
+"""
+Production serving config.
+
+    cd backend
+    gunicorn -c gunicorn.conf.py app:app
+
+The app (embedding model + default compiled graphs) is loaded once in the
+master and workers are forked from it, sharing that memory copy-on-write.
+"""
+import gc
+import os
+import multiprocessing
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(max(2, multiprocessing.cpu_count()))))
+# The LLM schedulers split the Groq quota between the workers (llm_scheduler.py)
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+# Scans mostly wait on the LLM provider, so each worker serves requests on threads
+worker_class = "gthread"
+threads = int(os.getenv("WORKER_THREADS", "4"))
+
+# Scans of large batches take minutes
+timeout = int(os.getenv("WORKER_TIMEOUT", "600"))
+graceful_timeout = 30
+keepalive = 5
+
+# Load the models before forking
+preload_app = True
+
+# Each worker gets a share of the cores for torch / onnxruntime instead of
+# every worker spinning up one thread per core. Set before the app is imported.
+os.environ.setdefault("OMP_NUM_THREADS", str(max(1, multiprocessing.cpu_count() // workers)))
+# HuggingFace tokenizers disable their own thread pool after a fork anyway
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+accesslog = "-"
+errorlog = "-"
+
+
+def when_ready(server):
+    # Move everything allocated during preload into the permanent generation
+    # so the garbage collector never touches (and thereby copies) those pages
+    gc.freeze()
+    server.log.info("Models preloaded, forking %s workers", workers)
+
+
+def post_fork(server, worker):
+    # `-w` on the command line overrides `workers` above, so re-split the
+    # LLM rate limits by the worker count actually in use
+    from langgraph_pipeline import schedulers
+    for scheduler in schedulers.values():
+        scheduler.set_quota_shares(server.cfg.workers)
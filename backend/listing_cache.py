@@ -0,0 +1,83 @@
+# listing_cache.py
+"""
+Short-TTL cache for storage listing responses.
+
+Each entry keeps the serialized JSON body and its ETag, so repeat
+requests are served without a Supabase round trip or re-hashing, and
+clients that send If-None-Match get a 304 with no body at all. Expired
+entries are dropped on every write and at most LISTING_CACHE_MAX entries are
+kept, so one-off keys (e.g. every page of a listing) cannot pile up.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+LISTING_CACHE_TTL = float(os.getenv("LISTING_CACHE_TTL", "30"))
+LISTING_CACHE_MAX = int(os.getenv("LISTING_CACHE_MAX", "1024"))
+
+
+class TTLCache:
+    def __init__(self, ttl: float = LISTING_CACHE_TTL, max_entries: int = LISTING_CACHE_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # oldest write first; with one TTL that is also soonest to expire
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while self._entries:
+                expires_at, _ = next(iter(self._entries.values()))
+                if now < expires_at and len(self._entries) <= self.max_entries:
+                    break
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+
+listing_cache = TTLCache()
+
+
+def cached_json_body(key, build_payload):
+    """
+    Return (body_bytes, etag) for a listing, building the payload only
+    when the cached entry is missing or expired.
+    """
+    entry = listing_cache.get(key)
+    if entry is None:
+        body = json.dumps(build_payload(), separators=(",", ":")).encode("utf-8")
+        entry = (body, hashlib.sha1(body).hexdigest())
+        listing_cache.set(key, entry)
+    return entry
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    """
+    True if the client already has this representation. Compression may
+    append an encoding suffix (e.g. "<etag>:br") to the ETag sent to the
+    client, so suffixed tags match too.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.star_tag:
+        return True
+    return any(tag == etag or tag.startswith(f"{etag}:") for tag in if_none_match.as_set(include_weak=True))
@@ -0,0 +1,243 @@
+# profiling.py
+"""
+Opt-in per-request profiling for the scan endpoints.
+
+Profiling is off unless PROFILE_TOKEN is set on the server. Then send
+`X-Profile: 1` (or `?profile=1`) together with `X-Profile-Token: <token>`
+with /api/scan or /api/scan-upload and the response gains a "profile"
+section with:
+- a sampling profile of the request in folded-stack format; download it
+  from the returned url (/api/profiles/<id>, same token header) and feed
+  it to flamegraph.pl or open it in speedscope.
+- a timeline of every LangGraph node and LLM call (start offset and
+  duration), which separates parsing, embedding, graph overhead and
+  Groq waits.
+
+Only one request per process is profiled at a time and the newest
+PROFILE_MAX_FILES profiles are kept in PROFILE_DIR. Without the flag
+nothing is installed: no sampler thread, no callbacks.
+"""
+import os
+import sys
+import hmac
+import json
+import time
+import uuid
+import tempfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "resume_profiles"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "20"))
+PROFILE_MAX_DEPTH = 128
+
+# The sampler walks every thread, so at most one profile runs per process
+_profile_slot = threading.Lock()
+
+
+def profile_access_allowed(request) -> bool:
+    """Profiling is enabled and the request carries the shared token."""
+    if not PROFILE_TOKEN:
+        return False
+    token = request.headers.get('X-Profile-Token', '')
+    return hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+
+
+def profiling_requested(request) -> bool:
+    flag = request.headers.get('X-Profile') or request.args.get('profile') or ''
+    return flag.lower() in ('1', 'true', 'yes') and profile_access_allowed(request)
+
+
+class StackSampler:
+    """
+    Samples the Python stacks of every thread at a fixed interval and
+    counts them as folded stacks ("thread;outer;...;inner count").
+
+    The agents run on LangGraph and LLM worker threads, so all threads are
+    sampled; concurrent requests in the same worker show up as well.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+
+class TimelineCallback(BaseCallbackHandler):
+    """Records start / end of LangGraph nodes and chat model calls."""
+
+    def __init__(self, origin: float, label: str = ""):
+        self.origin = origin
+        self.label = label
+        self.events = []
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, kind, name):
+        with self._lock:
+            self._open[run_id] = (kind, name, time.perf_counter())
+
+    def _end(self, run_id, error=None):
+        end = time.perf_counter()
+        with self._lock:
+            opened = self._open.pop(run_id, None)
+            if opened is None:
+                return
+            kind, name, start = opened
+            event = {
+                "kind": kind,
+                "name": name,
+                "start_ms": round((start - self.origin) * 1000, 2),
+                "duration_ms": round((end - start) * 1000, 2),
+                "thread": threading.current_thread().name,
+            }
+            if self.label:
+                event["resume"] = self.label
+            if error is not None:
+                event["error"] = f"{type(error).__name__}: {error}"
+            self.events.append(event)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get('langgraph_node')
+        # nested runnables inherit the node metadata; only time the node itself
+        if node and kwargs.get('name') == node:
+            self._start(run_id, "node", node)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get('langgraph_node', '')
+        model = ((serialized or {}).get('kwargs') or {}).get('model_name', 'llm')
+        self._start(run_id, "llm", f"{node}:{model}" if node else model)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+
+class RequestProfile:
+    def __init__(self, endpoint: str):
+        self.id = f"{time.strftime('%Y%m%d_%H%M%S')}_{endpoint}_{uuid.uuid4().hex[:8]}"
+        self.origin = time.perf_counter()
+        self.sampler = StackSampler()
+        self.timelines = []
+        self.duration_s = None
+
+    def graph_config(self, label: str = "") -> dict:
+        """Config for graph.invoke() that records this run's node timeline."""
+        timeline = TimelineCallback(self.origin, label)
+        self.timelines.append(timeline)
+        return {"callbacks": [timeline]}
+
+    def timeline(self) -> list:
+        events = [event for t in self.timelines for event in t.events]
+        return sorted(events, key=lambda e: e["start_ms"])
+
+    def save(self) -> dict:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(os.path.join(PROFILE_DIR, f"{self.id}.folded"), "w", encoding="utf-8") as f:
+            f.write(self.sampler.folded())
+
+        summary = {
+            "id": self.id,
+            "duration_ms": round(self.duration_s * 1000, 2),
+            "samples": self.sampler.samples,
+            "interval_ms": self.sampler.interval * 1000,
+            "flamegraph_url": f"/api/profiles/{self.id}",
+            "timeline": self.timeline(),
+        }
+        with open(os.path.join(PROFILE_DIR, f"{self.id}.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f)
+        prune_profiles()
+        return summary
+
+
+def prune_profiles(keep: int = PROFILE_MAX_FILES) -> None:
+    """Delete all but the newest `keep` profiles (both files of each)."""
+    saved = []
+    for name in os.listdir(PROFILE_DIR):
+        if name.endswith(".json"):
+            path = os.path.join(PROFILE_DIR, name)
+            try:
+                saved.append((os.path.getmtime(path), name[:-len(".json")]))
+            except OSError:
+                continue
+    saved.sort(reverse=True)
+
+    for _, profile_id in saved[keep:]:
+        for extension in ("json", "folded"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, f"{profile_id}.{extension}"))
+            except OSError:
+                pass
+
+
+@contextmanager
+def maybe_profile(request, endpoint: str):
+    """
+    Yields a RequestProfile when the request asked for profiling (and no
+    other request in this process is being profiled), else None.
+    After the block, profile.summary holds what to return to the client.
+    """
+    if not profiling_requested(request) or not _profile_slot.acquire(blocking=False):
+        yield None
+        return
+
+    try:
+        profile = RequestProfile(endpoint)
+        profile.sampler.start()
+        try:
+            yield profile
+        finally:
+            profile.sampler.stop()
+            profile.duration_s = time.perf_counter() - profile.origin
+            profile.summary = profile.save()
+    finally:
+        _profile_slot.release()
+
+
+def profile_path(profile_id: str, extension: str = "folded"):
+    """Path of a saved profile, or None if the id is unknown / malformed."""
+    if not profile_id or os.path.basename(profile_id) != profile_id:
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.{extension}")
+    return path if os.path.exists(path) else None
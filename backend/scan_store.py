@@ -0,0 +1,75 @@
+# scan_store.py
+"""
+Stored scan results, so further pages of a large scan are served without
+scanning (and paying for the LLM calls) again.
+
+/api/scan saves its full, ranked result list under a scan id and
+/api/scans/<scan_id> pages through it. Results are JSON files in
+SCAN_RESULTS_DIR, so every worker on the host can serve them; they are
+kept for SCAN_RESULTS_TTL seconds and at most SCAN_RESULTS_MAX are kept.
+"""
+import os
+import json
+import time
+import uuid
+import tempfile
+from typing import List, Optional
+
+SCAN_RESULTS_DIR = os.getenv("SCAN_RESULTS_DIR", os.path.join(tempfile.gettempdir(), "resume_scans"))
+SCAN_RESULTS_TTL = float(os.getenv("SCAN_RESULTS_TTL", str(24 * 3600)))
+SCAN_RESULTS_MAX = int(os.getenv("SCAN_RESULTS_MAX", "200"))
+
+
+def _path(scan_id: str) -> Optional[str]:
+    if not scan_id or not scan_id.isalnum():
+        return None
+    return os.path.join(SCAN_RESULTS_DIR, f"{scan_id}.json")
+
+
+def _prune() -> None:
+    """Drop expired scans, then the oldest ones beyond SCAN_RESULTS_MAX."""
+    entries = []
+    for name in os.listdir(SCAN_RESULTS_DIR):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(SCAN_RESULTS_DIR, name)
+        try:
+            entries.append((os.path.getmtime(path), path))
+        except OSError:
+            continue
+    entries.sort(reverse=True)
+
+    now = time.time()
+    for position, (mtime, path) in enumerate(entries):
+        if position >= SCAN_RESULTS_MAX or now - mtime > SCAN_RESULTS_TTL:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def save_scan(results: List[dict]) -> str:
+    """Store a ranked result list; returns its scan id."""
+    os.makedirs(SCAN_RESULTS_DIR, exist_ok=True)
+    scan_id = uuid.uuid4().hex
+    path = _path(scan_id)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(results, f)
+    os.replace(tmp_path, path)
+    _prune()
+    return scan_id
+
+
+def load_scan(scan_id: str) -> Optional[List[dict]]:
+    """The stored result list, or None if the id is unknown or expired."""
+    path = _path(scan_id)
+    if path is None:
+        return None
+    try:
+        if time.time() - os.path.getmtime(path) > SCAN_RESULTS_TTL:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,336 @@
+# batch_scan.py
+"""
+Resumable, shardable batch scanning of resumes stored in Supabase.
+
+Scan one folder, split across 4 processes / machines:
+
+    python batch_scan.py scan --folder 2025-11-26 --jd-file jd.txt \\
+        --skills "python,machine learning,communication" \\
+        --shard 0/4 --concurrency 8 --output results.0.jsonl
+
+Every finished resume is appended to the JSONL output and recorded in the
+checkpoint file (default: <output>.checkpoint), so rerunning the same
+command skips what is already done. Failed resumes are written to the
+output too, but not checkpointed, so a rerun retries them. Only
+--concurrency resumes are in flight at a time, so an interrupted scan stops
+right away instead of working (and paying for LLM calls) through a backlog.
+
+Results and checkpoint entries carry a scan_config id, a hash of the job
+description, skills, weights and similarity threshold. A rerun with a
+different configuration only skips resumes done under its own.
+
+Merge all shard outputs into one global ranking:
+
+    python batch_scan.py merge results.*.jsonl --output ranking.jsonl --top 50
+
+Merge refuses inputs mixing several configurations unless --config picks one.
+"""
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+import itertools
+import tempfile
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+DEFAULT_SKILLS = "python,machine learning,communication"
+
+
+def parse_shard(value: str):
+    """'i/N' -> (i, N), 0-based: shards of 4 are 0/4 .. 3/4."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("shard must look like i/N, e.g. 0/4")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be in 0..{count - 1}")
+    return index, count
+
+
+def positive_int(value: str) -> int:
+    """--concurrency: 0 workers would never scan anything."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected an integer, got {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def in_shard(storage_path: str, shard) -> bool:
+    """Stable assignment: the same path lands in the same shard on every machine."""
+    index, count = shard
+    digest = hashlib.sha1(storage_path.encode("utf-8")).hexdigest()
+    return int(digest, 16) % count == index
+
+
+def parse_weights(value: str):
+    """--weights JSON, checked up front so a typo does not cost a whole scan."""
+    from scoring import validate_weights
+    try:
+        return validate_weights(json.loads(value))
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"invalid weights: {e}")
+
+
+def scan_config_id(job_description: str, skills: list, weights, similarity_threshold) -> str:
+    """Stable id of everything that changes a resume's score."""
+    config = {
+        "job_description": job_description,
+        "skills": skills,
+        "weights": weights,
+        "similarity_threshold": similarity_threshold,
+    }
+    blob = json.dumps(config, sort_keys=True).encode("utf-8")
+    return hashlib.sha1(blob).hexdigest()[:12]
+
+
+def load_checkpoint(path: str, config_id: str) -> set:
+    """Storage paths checkpointed under this configuration ("<config id>\t<path>" lines)."""
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            entry_config, _, storage_path = line.rstrip("\n").partition("\t")
+            if storage_path and entry_config == config_id:
+                done.add(storage_path)
+    return done
+
+
+class ResultWriter:
+    """Appends results and checkpoint entries; lines are flushed as they complete."""
+
+    def __init__(self, output_path: str, checkpoint_path: str):
+        self._lock = threading.Lock()
+        self._output = open(output_path, "a", encoding="utf-8")
+        self._checkpoint = open(checkpoint_path, "a", encoding="utf-8")
+
+    def write(self, record: dict) -> None:
+        with self._lock:
+            self._output.write(json.dumps(record) + "\n")
+            self._output.flush()
+            if record.get("success"):
+                # only after the result line is on disk
+                os.fsync(self._output.fileno())
+                self._checkpoint.write(f"{record['scan_config']}\t{record['storage_path']}\n")
+                self._checkpoint.flush()
+
+    def close(self) -> None:
+        self._output.close()
+        self._checkpoint.close()
+
+
+def scan_one(graph, storage_path: str, job_description: str, skills: list,
+             work_dir: str, shard_label: str, config_id: str, include_details: bool) -> dict:
+    from supabase_client import download_resume_from_supabase
+    from llm_scheduler import llm_priority, BATCH
+
+    record = {
+        "storage_path": storage_path,
+        "filename": os.path.basename(storage_path),
+        "shard": shard_label,
+        "scan_config": config_id,
+    }
+    # one sub-directory per resume so equal file names never collide
+    local_dir = tempfile.mkdtemp(dir=work_dir)
+    try:
+        local_path = download_resume_from_supabase(storage_path, local_dir=local_dir)
+
+        initial_state = {
+            "resume_path": local_path,
+            "job_description": job_description,
+            "skills_required": skills,
+            "agent_outputs": {}
+        }
+        with llm_priority(BATCH):
+            result = graph.invoke(initial_state)
+
+        record.update({
+            "final_score": result.get("final_score", 0),
+            "final_breakdown": result.get("final_breakdown", {}),
+            "auto_filtered": result.get("auto_filtered", False),
+            "success": True,
+        })
+        if include_details:
+            record["details"] = result.get("agent_outputs", {})
+    except Exception as e:
+        record.update({"error": f"{type(e).__name__}: {e}", "success": False})
+    finally:
+        shutil.rmtree(local_dir, ignore_errors=True)
+
+    record["scanned_at"] = datetime.now(timezone.utc).isoformat()
+    return record
+
+
+def run_scan(args) -> int:
+    from supabase_client import list_all_resumes_in_supabase
+    from langgraph_pipeline import create_resume_graph
+
+    if args.jd_file:
+        with open(args.jd_file, "r", encoding="utf-8") as f:
+            job_description = f.read().strip()
+    else:
+        job_description = args.jd
+    skills = [s.strip() for s in args.skills.split(",") if s.strip()]
+    weights = args.weights
+
+    config_id = scan_config_id(job_description, skills, weights, args.similarity_threshold)
+    checkpoint_path = args.checkpoint or f"{args.output}.checkpoint"
+    done = load_checkpoint(checkpoint_path, config_id)
+
+    objects = list_all_resumes_in_supabase(folder=args.folder)
+    storage_paths = []
+    for obj in objects:
+        name = obj.get("name")
+        if not name or not name.lower().endswith(".pdf"):
+            continue
+        storage_path = f"{args.folder}/{name}" if args.folder else name
+        if in_shard(storage_path, args.shard) and storage_path not in done:
+            storage_paths.append(storage_path)
+
+    shard_label = f"{args.shard[0]}/{args.shard[1]}"
+    print(f"[INFO] {len(objects)} objects in '{args.folder or '/'}', shard {shard_label}, "
+          f"config {config_id}: {len(storage_paths)} to scan, {len(done)} already done")
+    if not storage_paths:
+        return 0
+
+    graph = create_resume_graph(
+        skills=skills,
+        evaluate_experience=True,
+        evaluate_culture=True,
+        evaluate_jd=bool(job_description),
+        similarity_threshold=args.similarity_threshold,
+        agent_weights=weights
+    )
+
+    work_dir = tempfile.mkdtemp(prefix="batch_scan_")
+    writer = ResultWriter(args.output, checkpoint_path)
+    pool = ThreadPoolExecutor(max_workers=args.concurrency)
+    remaining = iter(storage_paths)
+    pending = set()
+    failed = n = 0
+    try:
+        while True:
+            # submit only as many resumes as there are workers
+            for path in itertools.islice(remaining, args.concurrency - len(pending)):
+                pending.add(pool.submit(scan_one, graph, path, job_description, skills,
+                                        work_dir, shard_label, config_id, args.details))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                n += 1
+                record = future.result()
+                writer.write(record)
+                if record["success"]:
+                    status = f"score {record['final_score']}"
+                else:
+                    failed += 1
+                    status = f"FAILED ({record['error']})"
+                print(f"[{n}/{len(storage_paths)}] {record['storage_path']}: {status}")
+    except BaseException:
+        # Ctrl-C or a failed write: nothing more gets written, so stop scanning
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    else:
+        pool.shutdown()
+    finally:
+        writer.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"[INFO] Done: {len(storage_paths) - failed} scanned, {failed} failed -> {args.output}")
+    return 1 if failed else 0
+
+
+def run_merge(args) -> int:
+    """Latest successful record per resume across all inputs, ranked by score."""
+    best = {}
+    configs = set()
+    for path in args.inputs:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a shard killed mid-write leaves a partial last line
+                    continue
+                config_id = record.get("scan_config")
+                if args.config and config_id != args.config:
+                    continue
+                configs.add(config_id)
+                key = record.get("storage_path")
+                current = best.get(key)
+                if (current is None
+                        or (record.get("success") and not current.get("success"))
+                        or (record.get("success") == current.get("success")
+                            and record.get("scanned_at", "") > current.get("scanned_at", ""))):
+                    best[key] = record
+
+    if len(configs) > 1:
+        # scores of different job descriptions / weights are not comparable
+        listed = ", ".join(sorted(c or "<none>" for c in configs))
+        print(f"[ERROR] Inputs mix scan configurations ({listed}); pick one with --config", file=sys.stderr)
+        return 2
+
+    succeeded = [r for r in best.values() if r.get("success")]
+    failed = len(best) - len(succeeded)
+    ranking = sorted(succeeded, key=lambda r: r.get("final_score", 0), reverse=True)
+    if args.top:
+        ranking = ranking[:args.top]
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for rank, record in enumerate(ranking, start=1):
+            out.write(json.dumps({"rank": rank, **record}) + "\n")
+    finally:
+        if args.output:
+            out.close()
+
+    print(f"[INFO] Merged {len(best)} resumes ({failed} failed) from {len(args.inputs)} file(s)", file=sys.stderr)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan = commands.add_parser("scan", help="scan a Supabase folder (or one shard of it)")
+    scan.add_argument("--folder", default="", help="Supabase folder, e.g. 2025-11-26 (default: bucket root)")
+    scan.add_argument("--jd", default="Looking for a skilled professional.", help="job description text")
+    scan.add_argument("--jd-file", help="read the job description from a file")
+    scan.add_argument("--skills", default=DEFAULT_SKILLS, help="comma-separated skills")
+    scan.add_argument("--weights", type=parse_weights, help='agent weights as JSON, e.g. \'{"jd_match": 3}\'')
+    scan.add_argument("--similarity-threshold", type=float, help="auto-filter resumes below this JD similarity")
+    scan.add_argument("--shard", type=parse_shard, default=(0, 1), help="i/N: only scan shard i of N (0-based)")
+    scan.add_argument("--concurrency", type=positive_int, default=4, help="resumes evaluated in parallel")
+    scan.add_argument("--output", required=True, help="JSONL file results are appended to")
+    scan.add_argument("--checkpoint", help="checkpoint file (default: <output>.checkpoint)")
+    scan.add_argument("--details", action="store_true", help="include every agent's explanation")
+    scan.set_defaults(func=run_scan)
+
+    merge = commands.add_parser("merge", help="merge shard outputs into a global ranking")
+    merge.add_argument("inputs", nargs="+", help="JSONL files written by scan")
+    merge.add_argument("--output", help="ranking JSONL (default: stdout)")
+    merge.add_argument("--top", type=int, help="keep only the best N")
+    merge.add_argument("--config", help="only merge results of this scan_config id")
+    merge.set_defaults(func=run_merge)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
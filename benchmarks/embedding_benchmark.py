@@ -0,0 +1,141 @@
+"""
+Compare embedding backends: load time, query latency, batch throughput,
+peak RSS and cosine agreement with the PyTorch model.
+
+Each backend runs in its own subprocess so load time and RSS are not
+polluted by the other backends.
+
+    python benchmarks/embedding_benchmark.py
+    python benchmarks/embedding_benchmark.py --texts-dir ./sample_resumes_txt --queries 200
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+import numpy as np
+
+# Add parent directory to path to import existing modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_backends import EMBEDDING_BACKENDS, load_embedding_model
+
+SAMPLE_SKILLS = ["Python", "machine learning", "React", "PostgreSQL", "Kubernetes",
+                 "communication", "leadership", "data analysis", "AWS", "Django"]
+
+
+def synthetic_corpus(n: int):
+    """Resume-sized texts so the benchmark runs without private data."""
+    rng = np.random.default_rng(0)
+    texts = []
+    for i in range(n):
+        skills = ", ".join(rng.choice(SAMPLE_SKILLS, size=5, replace=False))
+        years = int(rng.integers(1, 15))
+        texts.append(
+            f"Candidate {i}. {years} years of experience as a software engineer. "
+            f"Skills: {skills}. Built and maintained production services, mentored "
+            f"junior engineers and worked closely with product and design teams. " * 4
+        )
+    return texts
+
+
+def load_corpus(texts_dir, n):
+    if not texts_dir:
+        return synthetic_corpus(n)
+    texts = []
+    for name in sorted(os.listdir(texts_dir)):
+        if name.endswith(".txt"):
+            with open(os.path.join(texts_dir, name), encoding="utf-8") as f:
+                texts.append(f.read())
+    return texts[:n]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_backend(backend, texts, queries, vectors_path):
+    start = time.perf_counter()
+    model = load_embedding_model(backend)
+    model.embed_query("warmup")
+    load_s = time.perf_counter() - start
+
+    latencies = []
+    for text in texts[:queries]:
+        t0 = time.perf_counter()
+        model.embed_query(text)
+        latencies.append(time.perf_counter() - t0)
+    latencies.sort()
+
+    t0 = time.perf_counter()
+    vectors = np.asarray(model.embed_documents(texts), dtype=np.float32)
+    batch_s = time.perf_counter() - t0
+    np.save(vectors_path, vectors)
+
+    return {
+        "backend": backend,
+        "load_s": round(load_s, 3),
+        "query_p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "query_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        "docs_per_s": round(len(texts) / batch_s, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def cosine_agreement(reference, candidate):
+    ref = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    cand = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosines = (ref * cand).sum(axis=1)
+    return round(float(cosines.mean()), 5), round(float(cosines.min()), 5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default=",".join(EMBEDDING_BACKENDS))
+    parser.add_argument("--texts-dir", default="", help="directory of .txt resumes (default: synthetic)")
+    parser.add_argument("--docs", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--vectors", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    texts = load_corpus(args.texts_dir, args.docs)
+
+    if args.child:
+        print(json.dumps(run_backend(args.child, texts, args.queries, args.vectors)))
+        return
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    workdir = tempfile.mkdtemp(prefix="embedding_bench_")
+    rows, vectors = [], {}
+
+    for backend in backends:
+        vectors_path = os.path.join(workdir, f"{backend}.npy")
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", backend, "--vectors", vectors_path,
+               "--docs", str(args.docs), "--queries", str(args.queries), "--texts-dir", args.texts_dir]
+        print(f"[INFO] Benchmarking {backend} ...")
+        output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        rows.append(json.loads(output.strip().splitlines()[-1]))
+        vectors[backend] = np.load(vectors_path)
+
+    reference = vectors.get("torch")
+    header = f"{'backend':<10} {'load_s':>7} {'p50_ms':>8} {'p95_ms':>8} {'docs/s':>8} {'rss_mb':>8} {'cos_mean':>9} {'cos_min':>8}"
+    print("\n" + header)
+    print("-" * len(header))
+    for row in rows:
+        if reference is not None:
+            cos_mean, cos_min = cosine_agreement(reference, vectors[row["backend"]])
+        else:
+            cos_mean, cos_min = float("nan"), float("nan")
+        print(f"{row['backend']:<10} {row['load_s']:>7} {row['query_p50_ms']:>8} {row['query_p95_ms']:>8} "
+              f"{row['docs_per_s']:>8} {row['peak_rss_mb']:>8} {cos_mean:>9} {cos_min:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Measure backend requests/sec as the gunicorn worker count grows.
+
+For each worker count a fresh gunicorn (backend/gunicorn.conf.py) is
+started, the script waits for /api/ready, then hammers one endpoint from
+a pool of client threads for a fixed duration.
+
+    python benchmarks/load_test.py --workers 1,2,4,8
+    python benchmarks/load_test.py --path /api/scan-upload --file sample.pdf --duration 60
+"""
+import os
+import sys
+import time
+import signal
+import argparse
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+
+def wait_until_ready(base_url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/api/ready", timeout=2) as resp:
+                if resp.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"backend not ready after {timeout}s")
+
+
+def build_request(base_url: str, path: str, file_path: str):
+    url = f"{base_url}{path}"
+    if not file_path:
+        return lambda: urllib.request.Request(url)
+
+    with open(file_path, "rb") as f:
+        payload = f.read()
+    boundary = "----loadtest"
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{os.path.basename(file_path)}"\r\n'
+        f"Content-Type: application/pdf\r\n\r\n"
+    ).encode() + payload + f"\r\n--{boundary}--\r\n".encode()
+    headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    return lambda: urllib.request.Request(url, data=body, headers=headers, method="POST")
+
+
+def hammer(make_request, duration: float, concurrency: int):
+    stop_at = time.monotonic() + duration
+    lock = threading.Lock()
+    counts = {"ok": 0, "errors": 0}
+    latencies = []
+
+    def client():
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(make_request(), timeout=600) as resp:
+                    resp.read()
+                ok = True
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                counts["ok" if ok else "errors"] += 1
+                if ok:
+                    latencies.append(elapsed)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else float("nan")
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else float("nan")
+    return counts["ok"] / duration, counts["errors"], p50, p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--path", default="/api/health")
+    parser.add_argument("--file", default="", help="PDF to POST as multipart 'file' (for scan endpoints)")
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    make_request = build_request(base_url, args.path, args.file)
+    rows = []
+
+    for workers in [int(w) for w in args.workers.split(",")]:
+        env = dict(os.environ, WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{args.port}")
+        print(f"[INFO] Starting gunicorn with {workers} worker(s) ...")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+            cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_until_ready(base_url, args.startup_timeout)
+            rows.append((workers, *hammer(make_request, args.duration, args.concurrency)))
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+
+    base_rps = rows[0][1] if rows and rows[0][1] else None
+    print(f"\n{args.path}  concurrency={args.concurrency}  duration={args.duration}s")
+    print(f"{'workers':>7} {'req/s':>9} {'speedup':>8} {'errors':>7} {'p50_ms':>8} {'p95_ms':>8}")
+    for workers, rps, errors, p50, p95 in rows:
+        speedup = f"{rps / base_rps:.2f}x" if base_rps else "-"
+        print(f"{workers:>7} {rps:>9.1f} {speedup:>8} {errors:>7} {p50:>8.1f} {p95:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
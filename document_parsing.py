@@ -0,0 +1,208 @@
+# document_parsing.py
+"""
+Bounded resume text extraction.
+
+Every parse is capped by file size, page count and a text budget (pages
+are read lazily and reading stops once the budget is reached). With
+isolation on, the file is read in a separate process with a wall-clock
+timeout and an address-space limit, so a pathological PDF is killed
+instead of pinning a worker or exhausting its memory. OCR of scanned
+pages then runs in this process's shared OCR pool (see ocr_fallback.py),
+within whatever is left of the timeout.
+"""
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pypdf import PdfReader
+from docx import Document
+
+from ocr_fallback import page_needs_ocr, page_images, ocr_pages
+
+PARSE_MAX_BYTES = int(os.getenv("PARSE_MAX_BYTES", str(10 * 1024 * 1024)))
+PARSE_MAX_PAGES = int(os.getenv("PARSE_MAX_PAGES", "30"))
+PARSE_MAX_CHARS = int(os.getenv("PARSE_MAX_CHARS", "100000"))
+PARSE_ISOLATION = os.getenv("PARSE_ISOLATION", "1") == "1"
+PARSE_TIMEOUT = float(os.getenv("PARSE_TIMEOUT", "60"))
+PARSE_MEMORY_MB = int(os.getenv("PARSE_MEMORY_MB", "1024"))
+
+
+class DocumentRejected(ValueError):
+    """The document exceeded a parsing limit or could not be parsed safely."""
+
+
+def read_pdf_pages(resume_path: str, max_pages: int = PARSE_MAX_PAGES,
+                   max_chars: int = PARSE_MAX_CHARS) -> Tuple[List[str], Dict[int, List[bytes]]]:
+    """
+    Extract the text layer page by page until the text budget is spent.
+
+    Returns (page_texts, scanned): scanned maps the index of every page
+    without a text layer (scanned PDFs) to its embedded images, for OCR.
+    """
+    reader = PdfReader(resume_path)
+    page_count = len(reader.pages)
+    if page_count > max_pages:
+        raise DocumentRejected(f"PDF has {page_count} pages, limit is {max_pages}.")
+
+    page_texts = []
+    scanned_pages = {}
+    total_chars = 0
+
+    for i in range(page_count):
+        page = reader.pages[i]
+        page_text = page.extract_text() or ""
+        page_texts.append(page_text)
+        if page_needs_ocr(page_text):
+            scanned_pages[i] = page_images(page)
+        total_chars += len(page_text)
+        if total_chars >= max_chars:
+            break
+
+    return page_texts, scanned_pages
+
+
+def join_pages(page_texts: List[str], scanned_pages: Dict[int, List[bytes]],
+               max_chars: int = PARSE_MAX_CHARS, ocr_budget: Optional[float] = None) -> str:
+    """OCR the scanned pages (only those) into their slots and join all pages."""
+    page_texts = list(page_texts)
+    if scanned_pages:
+        for i, page_text in ocr_pages(scanned_pages, budget=ocr_budget).items():
+            page_texts[i] = page_text
+
+    return ("\n".join(page_texts) + "\n")[:max_chars]
+
+
+def extract_pdf_text(resume_path: str, max_pages: int = PARSE_MAX_PAGES,
+                     max_chars: int = PARSE_MAX_CHARS) -> str:
+    """Text layer of every page, OCR for pages without one."""
+    page_texts, scanned_pages = read_pdf_pages(resume_path, max_pages=max_pages, max_chars=max_chars)
+    return join_pages(page_texts, scanned_pages, max_chars=max_chars)
+
+
+def extract_docx_text(resume_path: str, max_chars: int = PARSE_MAX_CHARS) -> str:
+    doc = Document(resume_path)
+    text = ""
+    for para in doc.paragraphs:
+        text += para.text + "\n"
+        if len(text) >= max_chars:
+            break
+    return text[:max_chars]
+
+
+def _check_size(resume_path: str, max_bytes: int) -> None:
+    size = os.path.getsize(resume_path)
+    if size > max_bytes:
+        raise DocumentRejected(f"File is {size} bytes, limit is {max_bytes}.")
+
+
+def extract_text(resume_path: str, max_bytes: int = PARSE_MAX_BYTES,
+                 max_pages: int = PARSE_MAX_PAGES, max_chars: int = PARSE_MAX_CHARS) -> str:
+    """Extract text in-process, enforcing the size, page and text limits."""
+    _check_size(resume_path, max_bytes)
+
+    lower_path = resume_path.lower()
+    if lower_path.endswith(".pdf"):
+        return extract_pdf_text(resume_path, max_pages=max_pages, max_chars=max_chars)
+    if lower_path.endswith(".docx"):
+        return extract_docx_text(resume_path, max_chars=max_chars)
+    raise ValueError("Unsupported file format. Only PDF/DOCX allowed.")
+
+
+def read_document(resume_path: str, max_bytes: int = PARSE_MAX_BYTES,
+                  max_pages: int = PARSE_MAX_PAGES, max_chars: int = PARSE_MAX_CHARS):
+    """
+    Everything but OCR, i.e. the part that touches the untrusted file:
+    (page_texts, scanned_pages) as returned by read_pdf_pages. A DOCX
+    comes back as a single page.
+    """
+    _check_size(resume_path, max_bytes)
+
+    lower_path = resume_path.lower()
+    if lower_path.endswith(".pdf"):
+        return read_pdf_pages(resume_path, max_pages=max_pages, max_chars=max_chars)
+    if lower_path.endswith(".docx"):
+        return [extract_docx_text(resume_path, max_chars=max_chars)], {}
+    raise ValueError("Unsupported file format. Only PDF/DOCX allowed.")
+
+
+def _isolated_worker(conn, resume_path, limits, memory_mb):
+    """Child process entry point: apply the memory cap, read the file, send the result back."""
+    try:
+        import resource
+        cap = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (cap, cap))
+    except (ImportError, ValueError, OSError):
+        pass
+
+    try:
+        conn.send(("ok", read_document(resume_path, **limits)))
+    except MemoryError:
+        conn.send(("error", "DocumentRejected", f"Parsing exceeded the {memory_mb} MB memory limit."))
+    except Exception as e:
+        conn.send(("error", type(e).__name__, str(e)))
+    finally:
+        conn.close()
+
+
+def _mp_context():
+    import multiprocessing
+    # forkserver children start from a small, clean process instead of a
+    # copy of a (possibly multi-threaded) web worker
+    if sys.platform.startswith("linux"):
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload([__name__])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+def extract_text_isolated(resume_path: str, timeout: float = PARSE_TIMEOUT,
+                          memory_mb: int = PARSE_MEMORY_MB, **limits) -> str:
+    """
+    Read the file in a child process bounded by wall-clock time and memory,
+    then OCR its scanned pages here with the rest of `timeout`; pages OCR
+    cannot finish in time are left empty instead of failing the parse.
+    """
+    start = time.monotonic()
+    ctx = _mp_context()
+    receiver, sender = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_isolated_worker, args=(sender, resume_path, limits, memory_mb))
+    process.start()
+    sender.close()
+
+    try:
+        if not receiver.poll(timeout):
+            raise DocumentRejected(f"Parsing did not finish within {timeout}s.")
+        try:
+            message = receiver.recv()
+        except EOFError:
+            process.join(1)
+            raise DocumentRejected(f"Parser process died (exit code {process.exitcode}).")
+    finally:
+        receiver.close()
+        if process.is_alive():
+            process.kill()
+        process.join()
+
+    if message[0] == "ok":
+        page_texts, scanned_pages = message[1]
+        ocr_budget = max(0.0, timeout - (time.monotonic() - start))
+        return join_pages(page_texts, scanned_pages,
+                          max_chars=limits.get("max_chars", PARSE_MAX_CHARS), ocr_budget=ocr_budget)
+
+    _, error_type, error_message = message
+    if error_type == "DocumentRejected":
+        raise DocumentRejected(error_message)
+    raise ValueError(f"Failed to parse resume ({error_type}): {error_message}")
+
+
+def parse_document(resume_path: str, isolated: Optional[bool] = None) -> str:
+    """Extract resume text with the configured limits (isolated unless PARSE_ISOLATION=0)."""
+    if not resume_path.lower().endswith((".pdf", ".docx")):
+        raise ValueError("Unsupported file format. Only PDF/DOCX allowed.")
+
+    if isolated is None:
+        isolated = PARSE_ISOLATION
+    if isolated:
+        return extract_text_isolated(resume_path)
+    return extract_text(resume_path)
@@ -0,0 +1,149 @@
+# embedding_backends.py
+"""
+Selectable embedding backends for the resume pipeline.
+
+    EMBEDDING_BACKEND=torch      HuggingFaceEmbeddings (PyTorch, fp32) - default
+    EMBEDDING_BACKEND=onnx       ONNX Runtime, fp32
+    EMBEDDING_BACKEND=onnx-int8  ONNX Runtime, dynamic int8 quantization
+
+All backends expose embed_query / embed_documents. The ONNX model is
+exported once into ONNX_MODEL_DIR (this step needs torch + transformers);
+after that the ONNX backends only load onnxruntime and tokenizers.
+
+Export ahead of deployment with:
+    python embedding_backends.py --export
+"""
+import os
+from typing import List
+
+import numpy as np
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "./onnx_models/all-MiniLM-L6-v2")
+# all-MiniLM-L6-v2 is configured with max_seq_length=256 in sentence-transformers
+EMBEDDING_MAX_LENGTH = 256
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def export_onnx_model(model_name: str = EMBEDDING_MODEL_NAME, output_dir: str = ONNX_MODEL_DIR,
+                      quantize: bool = True) -> str:
+    """
+    Export the transformer to ONNX (model.onnx), optionally with an int8
+    copy (model.int8.onnx), and save the tokenizer next to it.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    fp32_path = os.path.join(output_dir, "model.onnx")
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    tokenizer.save_pretrained(output_dir)
+
+    if not os.path.exists(fp32_path):
+        model = AutoModel.from_pretrained(model_name)
+        model.eval()
+        sample = tokenizer(["export sample"], return_tensors="pt")
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+                fp32_path,
+                input_names=["input_ids", "attention_mask", "token_type_ids"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "token_type_ids": {0: "batch", 1: "sequence"},
+                    "last_hidden_state": {0: "batch", 1: "sequence"},
+                },
+                opset_version=14,
+            )
+
+    int8_path = os.path.join(output_dir, "model.int8.onnx")
+    if quantize and not os.path.exists(int8_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    return output_dir
+
+
+class OnnxEmbeddings:
+    """
+    MiniLM on ONNX Runtime with sentence-transformers semantics
+    (mean pooling over the attention mask, then L2 normalization).
+    """
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, quantized: bool = False,
+                 batch_size: int = 32, max_length: int = EMBEDDING_MAX_LENGTH,
+                 num_threads: int = 0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_file = "model.int8.onnx" if quantized else "model.onnx"
+        model_path = os.path.join(model_dir, model_file)
+        if not os.path.exists(model_path):
+            export_onnx_model(output_dir=model_dir, quantize=quantized)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        self.batch_size = batch_size
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        hidden = self.session.run(None, feeds)[0]
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed_batch(texts[start:start + self.batch_size]).tolist())
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+
+def load_embedding_model(backend: str = EMBEDDING_BACKEND):
+    """Build the embedding model for the selected backend."""
+    if backend == "torch":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    if backend == "onnx":
+        return OnnxEmbeddings(quantized=False)
+    if backend == "onnx-int8":
+        return OnnxEmbeddings(quantized=True)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}'. Use one of: {', '.join(EMBEDDING_BACKENDS)}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export MiniLM to ONNX (fp32 + int8).")
+    parser.add_argument("--export", action="store_true", help="export the ONNX models")
+    parser.add_argument("--output-dir", default=ONNX_MODEL_DIR)
+    args = parser.parse_args()
+
+    if args.export:
+        print(f"[INFO] Exported ONNX models to {export_onnx_model(output_dir=args.output_dir)}")
+    else:
+        parser.print_help()
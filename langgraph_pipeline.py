@@ -1,15 +1,25 @@
 from __future__ import annotations
 from typing import Dict, List, Any, Optional, TypedDict, Annotated
 import os
-import json
+import threading
+from collections import OrderedDict
 from operator import or_
-from supabase_client import list_resumes_in_supabase, download_resume_from_supabase
+import numpy as np
 from langgraph.graph import StateGraph, END
 from langchain_groq.chat_models import ChatGroq
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from pypdf import PdfReader
-from docx import Document
-import pytesseract
+from embedding_backends import load_embedding_model
+from document_parsing import parse_document
+from llm_router import ModelRouter
+from scoring import DEFAULT_AGENT_WEIGHTS, validate_weights, weighted_score
+from llm_resilience import ResilientLLM, CircuitBreaker
+from llm_scheduler import LLMScheduler
+from structured_output import (
+    AgentScore,
+    parse_agent_response,
+    parse_stats,
+    response_text,
+    build_reask_prompt,
+)
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field    
 from groq import Groq
@@ -28,6 +38,8 @@ class ResumeState(TypedDict, total=False):
     job_description: str
     resume_text: str
     resume_embedding: List[float]
+    jd_similarity: float
+    auto_filtered: bool
     agent_outputs: Annotated[Dict[str, Dict[str, Any]], merge_dicts]
     final_score: float
     final_breakdown: Dict[str, float]
@@ -39,21 +51,9 @@ def parse_resume_agent(state: ResumeState) -> dict:
     if not resume_path or not os.path.exists(resume_path):
         raise ValueError("Resume file path is invalid or file not found.")
 
-    text = ""
-    # PDF Parsing
-    if resume_path.lower().endswith(".pdf"):
-        reader = PdfReader(resume_path)
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-
-    # DOCX Parsing
-    elif resume_path.lower().endswith(".docx"):
-        doc = Document(resume_path)
-        for para in doc.paragraphs:
-            text += para.text + "\n"
-
-    else:
-        raise ValueError("Unsupported file format. Only PDF/DOCX allowed.")
+    # PDF / DOCX parsing, bounded by size, page and text limits and
+    # isolated in a child process (see document_parsing.py)
+    text = parse_document(resume_path)
 
     # Clean text
     clean_text = text.strip().replace("\t", " ")
@@ -61,9 +61,8 @@ def parse_resume_agent(state: ResumeState) -> dict:
     return {"resume_text": clean_text}
 
 
-embedding_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2"
-)
+# EMBEDDING_BACKEND selects torch (default), onnx or onnx-int8 (see embedding_backends.py)
+embedding_model = load_embedding_model()
 
 
 def embed_resume_agent(state: ResumeState) -> dict:
@@ -76,11 +75,164 @@ def embed_resume_agent(state: ResumeState) -> dict:
     return {"resume_embedding": vector}
 
 
+# JD text -> embedding. The same JD is reused for every resume in a batch,
+# so it only has to be embedded once per process. JDs come from clients,
+# so only the most recently used are kept.
+JD_EMBEDDING_CACHE_SIZE = int(os.getenv("JD_EMBEDDING_CACHE_SIZE", "64"))
+_jd_embedding_cache: Dict[str, List[float]] = OrderedDict()
+_jd_embedding_lock = threading.Lock()
+
+
+def get_jd_embedding(job_description: str) -> List[float]:
+    """Return the (cached) embedding of a job description."""
+    with _jd_embedding_lock:
+        vector = _jd_embedding_cache.get(job_description)
+        if vector is not None:
+            _jd_embedding_cache.move_to_end(job_description)
+            return vector
+
+    vector = embedding_model.embed_query(job_description)
+    with _jd_embedding_lock:
+        _jd_embedding_cache[job_description] = vector
+        while len(_jd_embedding_cache) > JD_EMBEDDING_CACHE_SIZE:
+            _jd_embedding_cache.popitem(last=False)
+    return vector
+
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    denom = float(np.linalg.norm(a) * np.linalg.norm(b))
+    if denom == 0.0:
+        return 0.0
+    return float(np.dot(a, b) / denom)
+
+
+def similarity_gate_agent(state: ResumeState) -> dict:
+    """
+    Cheap pre-screen: cosine similarity between the resume embedding
+    and the JD embedding. Routing happens in the conditional edge.
+    """
+    resume_embedding = state.get("resume_embedding")
+    job_description = state.get("job_description")
+    if resume_embedding is None:
+        raise ValueError("Resume embedding missing. Run embedding first.")
+    if not job_description:
+        # Nothing to compare against, let every resume through
+        return {"auto_filtered": False}
+
+    similarity = cosine_similarity(resume_embedding, get_jd_embedding(job_description))
+    return {"jd_similarity": round(similarity, 4)}
+
+
+def auto_filter_agent(state: ResumeState) -> dict:
+    """
+    Terminal node for resumes rejected by the similarity gate.
+    Produces the same output shape as the aggregator without any LLM call.
+    The breakdown stays empty: the similarity is not an agent score and
+    must not count when results are re-weighted.
+    """
+    similarity = state.get("jd_similarity", 0.0)
+    result = {
+        "score": 0,
+        "explanation": f"Auto-filtered: resume/JD embedding similarity {similarity:.2f} is below the threshold.",
+        "similarity": similarity,
+        "auto_filtered": True,
+    }
+    return {
+        "agent_outputs": {"similarity_gate": result},
+        "auto_filtered": True,
+        "final_score": 0,
+        "final_breakdown": {},
+    }
+
+
 llm = ChatGroq(
     api_key="",
     model="llama-3.3-70b-versatile"
 )
 
+small_llm = ChatGroq(
+    api_key="",
+    model=os.getenv("GROQ_SMALL_MODEL", "llama-3.1-8b-instant")
+)
+
+# Optional extra Groq API keys (comma-separated) to spread calls over;
+# each key gets its own rate-limit buckets in the scheduler.
+GROQ_EXTRA_API_KEYS = [k.strip() for k in os.getenv("GROQ_EXTRA_API_KEYS", "").split(",") if k.strip()]
+
+
+def per_key_clients(model):
+    """The given client plus a client for the same model per extra API key."""
+    return [model] + [ChatGroq(api_key=key, model=model.model_name) for key in GROQ_EXTRA_API_KEYS]
+
+# "function_calling" (tool calling) or "json_mode"
+STRUCTURED_OUTPUT_METHOD = os.getenv("LLM_STRUCTURED_METHOD", "function_calling")
+
+
+def structured(model):
+    """Constrain a chat model to AgentScore, keeping the raw reply for local repair."""
+    return model.with_structured_output(AgentScore, method=STRUCTURED_OUTPUT_METHOD, include_raw=True)
+
+
+# Groq limits each model separately, so every tier has its own scheduler.
+# The limits are per API key; each process schedules against its
+# 1/WEB_CONCURRENCY share of them (see llm_scheduler.py).
+schedulers = {
+    "small": LLMScheduler(
+        "small",
+        n_keys=1 + len(GROQ_EXTRA_API_KEYS),
+        tokens_per_minute=float(os.getenv("GROQ_SMALL_TPM", "6000")),
+        requests_per_minute=float(os.getenv("GROQ_SMALL_RPM", "30"))
+    ),
+    "large": LLMScheduler(
+        "large",
+        n_keys=1 + len(GROQ_EXTRA_API_KEYS),
+        tokens_per_minute=float(os.getenv("GROQ_LARGE_TPM", "12000")),
+        requests_per_minute=float(os.getenv("GROQ_LARGE_RPM", "30"))
+    ),
+}
+
+# Both tiers hit Groq, so they share one circuit breaker: when the provider
+# is down every agent fails fast instead of waiting out its deadline.
+groq_breaker = CircuitBreaker()
+resilient_tiers = {
+    "small": ResilientLLM([structured(m) for m in per_key_clients(small_llm)], name="small",
+                          breaker=groq_breaker, scheduler=schedulers["small"]),
+    "large": ResilientLLM([structured(m) for m in per_key_clients(llm)], name="large",
+                          breaker=groq_breaker, scheduler=schedulers["large"]),
+}
+
+# Cheap agents try the small model first and escalate to the 70B model
+# when the answer is borderline or unparseable (see llm_router.py).
+router = ModelRouter(resilient_tiers)
+
+
+def run_llm_agent(agent_name: str, prompt: str, error_message: str) -> dict:
+    """
+    Route the prompt through the model tiers for this agent.
+
+    Replies are parsed as structured output, then as plain / locally
+    repaired JSON (see structured_output.py). If no tier produced a usable
+    reply, the large model is re-asked once before falling back to a
+    zero score carrying the raw output.
+    """
+    result, response = router.invoke(agent_name, prompt, parse=parse_agent_response)
+    if result is not None:
+        return result
+
+    raw_output = response_text(response)
+    result, _ = router.invoke_tier("large", build_reask_prompt(prompt, raw_output), parse=parse_agent_response)
+    if result is not None:
+        parse_stats.record("reask")
+        return result
+
+    parse_stats.record("failed")
+    return {
+        "score": 0,
+        "explanation": f"{error_message} Raw output: {raw_output}"
+    }
+
 
 def skill_match_agent(skill: str):
     """
@@ -114,18 +266,10 @@ Example format:
 }}
 """
 
-        response = llm.invoke(prompt)
-        raw_output = response.content.strip()
+        agent_name = f"skill_{skill.lower().replace(' ', '_')}"
+        result = run_llm_agent(agent_name, prompt, f"Invalid JSON returned for skill '{skill}'.")
 
-        try:
-            result = json.loads(raw_output)
-        except Exception:
-            result = {
-                "score": 0,
-                "explanation": f"Invalid JSON returned for skill '{skill}'. Raw output: {raw_output}"
-            }
-
-        return {"agent_outputs": {f"skill_{skill.lower().replace(' ', '_')}": result}}
+        return {"agent_outputs": {agent_name: result}}
 
     return agent
 
@@ -163,16 +307,7 @@ Example:
 }}
 """
 
-    response = llm.invoke(prompt)
-    raw_output = response.content.strip()
-
-    try:
-        result = json.loads(raw_output)
-    except:
-        result = {
-            "score": 0,
-            "explanation": f"Invalid JSON for experience evaluation. Raw output: {raw_output}"
-        }
+    result = run_llm_agent("experience_validation", prompt, "Invalid JSON for experience evaluation.")
 
     return {"agent_outputs": {"experience_validation": result}}
 
@@ -211,16 +346,7 @@ Example:
 }}
 """
 
-    response = llm.invoke(prompt)
-    raw_output = response.content.strip()
-
-    try:
-        result = json.loads(raw_output)
-    except:
-        result = {
-            "score": 0,
-            "explanation": f"Invalid JSON for culture fit evaluation. Raw output: {raw_output}"
-        }
+    result = run_llm_agent("culture_fit", prompt, "Invalid JSON for culture fit evaluation.")
 
     return {"agent_outputs": {"culture_fit": result}}
 
@@ -263,24 +389,19 @@ Return STRICTLY a JSON object:
 }}
 """
 
-    response = llm.invoke(prompt)
-    raw_output = response.content.strip()
-
-    try:
-        result = json.loads(raw_output)
-    except:
-        result = {
-            "score": 0,
-            "explanation": f"Invalid JSON for JD match evaluation. Raw output: {raw_output}"
-        }
+    result = run_llm_agent("jd_match", prompt, "Invalid JSON for JD match evaluation.")
 
     return {"agent_outputs": {"jd_match": result}}
 
 
-def aggregator_agent(state: ResumeState) -> dict:
+def aggregator_agent(state: ResumeState, weights: Optional[Dict[str, float]] = None) -> dict:
     """
     Aggregates all scores from all agents (dynamic skill agents + fixed agents)
     and produces a final score between 0 and 10.
+
+    The final score is the weighted mean of the agent scores; weights map
+    agent names or patterns to multipliers (see scoring.py) and default to
+    AGENT_WEIGHTS, which is empty, i.e. a plain average.
     """
 
     outputs = state.get("agent_outputs", {})
@@ -288,8 +409,6 @@ def aggregator_agent(state: ResumeState) -> dict:
     if not outputs:
         raise ValueError("No agent outputs found. Nothing to aggregate.")
 
-    total_score = 0
-    count = 0
     breakdown = {}
 
     # Loop through all agents' results
@@ -302,23 +421,31 @@ def aggregator_agent(state: ResumeState) -> dict:
         # Store score in breakdown
         breakdown[agent_name] = score
 
-        total_score += score
-        count += 1
-
-    # Compute final 0–10 average
-    if count > 0:
-        final_score = round(total_score / count, 2)
-    else:
-        final_score = 0
+    # Compute final 0–10 weighted average
+    if weights is None:
+        weights = DEFAULT_AGENT_WEIGHTS
+    final_score = weighted_score(breakdown, weights)
 
     return {"final_score": final_score, "final_breakdown": breakdown}
 
 
-def create_resume_graph(skills: list, evaluate_experience=True, evaluate_culture=True, evaluate_jd=True):
+def create_resume_graph(skills: list, evaluate_experience=True, evaluate_culture=True, evaluate_jd=True,
+                        similarity_threshold: Optional[float] = None,
+                        agent_weights: Optional[Dict[str, float]] = None):
     """
     Creates the full LangGraph pipeline dynamically based on HR input.
+
+    agent_weights overrides the aggregation weights per agent name or
+    pattern, e.g. {"jd_match": 3, "culture_fit": 0.5}; invalid weights
+    raise ValueError here rather than after the agents ran.
+
+    If similarity_threshold is set, a gate node runs after embedding and
+    resumes whose cosine similarity to the JD is below the threshold skip
+    all LLM agents and are returned as auto-filtered.
     """
 
+    agent_weights = validate_weights(agent_weights)
+
     # Initialize the graph with ResumeState
     graph = StateGraph(ResumeState)
 
@@ -358,38 +485,52 @@ def create_resume_graph(skills: list, evaluate_experience=True, evaluate_culture
     # -----------------------------
     graph.add_edge("parse_resume", "embed_resume")
 
-    # -----------------------------
-    # Parallel Edges: embed → skill nodes
-    # -----------------------------
-    for node in skill_nodes:
-        graph.add_edge("embed_resume", node)
+    # All evaluation nodes (fan-out from embed / gate, fan-in to aggregate)
+    fan_in_nodes = skill_nodes.copy()
 
-    # Parallel Edges: embed → fixed nodes
     if evaluate_experience:
-        graph.add_edge("embed_resume", "experience_validation")
+        fan_in_nodes.append("experience_validation")
 
     if evaluate_culture:
-        graph.add_edge("embed_resume", "culture_fit")
+        fan_in_nodes.append("culture_fit")
 
     if evaluate_jd:
-        graph.add_edge("embed_resume", "jd_match")
+        fan_in_nodes.append("jd_match")
+
+    if similarity_threshold is None:
+        # -----------------------------
+        # Parallel Edges: embed → evaluation nodes
+        # -----------------------------
+        for node in fan_in_nodes:
+            graph.add_edge("embed_resume", node)
+    else:
+        # -----------------------------
+        # Similarity Gate: embed → gate → (evaluation nodes | auto_filter)
+        # -----------------------------
+        graph.add_node("similarity_gate", similarity_gate_agent)
+        graph.add_node("auto_filter", auto_filter_agent)
+        graph.add_edge("embed_resume", "similarity_gate")
+
+        def route_after_gate(state: ResumeState):
+            similarity = state.get("jd_similarity")
+            if similarity is not None and similarity < similarity_threshold:
+                return "auto_filter"
+            return fan_in_nodes
+
+        graph.add_conditional_edges(
+            "similarity_gate",
+            route_after_gate,
+            fan_in_nodes + ["auto_filter"]
+        )
+        graph.add_edge("auto_filter", END)
 
     # -----------------------------
     # Aggregator Node
     # -----------------------------
-    graph.add_node("aggregate", aggregator_agent)
-
-    # All nodes converge into the aggregator
-    fan_in_nodes = skill_nodes.copy()
-
-    if evaluate_experience:
-        fan_in_nodes.append("experience_validation")
+    def aggregate(state: ResumeState) -> dict:
+        return aggregator_agent(state, weights=agent_weights)
 
-    if evaluate_culture:
-        fan_in_nodes.append("culture_fit")
-
-    if evaluate_jd:
-        fan_in_nodes.append("jd_match")
+    graph.add_node("aggregate", aggregate)
 
     # Connect all evaluation nodes → aggregate
     for node in fan_in_nodes:
@@ -402,78 +543,13 @@ def create_resume_graph(skills: list, evaluate_experience=True, evaluate_culture
     return graph.compile()
 
 if __name__ == "__main__":
-    # 1. Create the graph once
-    graph = create_resume_graph(
-        skills=["python", "machine learning", "communication"],
-        evaluate_experience=True,
-        evaluate_culture=True,
-        evaluate_jd=True
-    )
-
-    # OPTIONAL: if you stored files under a date folder like "2025-11-26",
-    # put that here. If not, leave it as "" to scan the root of the bucket.
-    supabase_folder = "2025-11-26"  # e.g. "" or "2025-11-26"
-
-    # 2. List resumes from Supabase
-    objects = list_resumes_in_supabase(folder=supabase_folder)
-    print(f"[INFO] Found {len(objects)} objects in Supabase folder '{supabase_folder or '/'}'")
-
-    results = []
-
-    for obj in objects:
-        name = obj.get("name")
-        if not name:
-            continue
-
-        # only care about PDFs
-        if not name.lower().endswith(".pdf"):
-            continue
-
-        # full path inside the bucket
-        storage_path = f"{supabase_folder}/{name}" if supabase_folder else name
-        print(f"\n[INFO] Processing Supabase file: {storage_path}")
-
-        # 3. Download to a temp local path, because your graph expects a file path
-        local_resume_path = download_resume_from_supabase(
-            storage_path,
-            local_dir="./temp_resumes"
-        )
-        print(f"  [DOWNLOADED] -> {local_resume_path}")
-
-        # 4. Build the initial state just like you did before
-        initial_state = {
-            "resume_path": local_resume_path,
-            "job_description": "Looking for a backend engineer with ML + Python experience.",
-            "skills_required": ["python", "machine learning", "communication"],
-            "agent_outputs": {}
-        }
-
-        # 5. Run the LangGraph pipeline
-        result = graph.invoke(initial_state)
-
-        final_score = result.get("final_score", 0)
-        breakdown = result.get("final_breakdown", {})
-
-        print("  FINAL SCORE:", final_score)
-        print("  BREAKDOWN:", breakdown)
-
-        results.append({
-            "storage_path": storage_path,
-            "local_path": local_resume_path,
-            "final_score": final_score,
-            "final_breakdown": breakdown,
-        })
-
-    # 6. (Optional) Sort by score and show summary
-    if results:
-        results_sorted = sorted(results, key=lambda x: x["final_score"], reverse=True)
-
-        print("\n=== SUMMARY (sorted by score) ===")
-        for r in results_sorted:
-            print(f"\nResume: {r['storage_path']}")
-            print(f"  Local: {r['local_path']}")
-            print(f"  Score: {r['final_score']}")
-            print(f"  Breakdown: {r['final_breakdown']}")
-    else:
-        print("\n[INFO] No PDF resumes found in Supabase to analyze.")
+    # Batch scanning lives in batch_scan.py; this keeps `python langgraph_pipeline.py`
+    # working for one folder, e.g.:
+    #   python langgraph_pipeline.py scan --folder 2025-11-26 --output results.jsonl
+    import sys
+
+    # Let batch_scan reuse this already-loaded module (embedding model included)
+    sys.modules.setdefault("langgraph_pipeline", sys.modules[__name__])
+    from batch_scan import main
 
+    sys.exit(main())
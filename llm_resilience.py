@@ -0,0 +1,381 @@
+# llm_resilience.py
+"""
+Resilient wrapper around chat model calls.
+
+ResilientLLM keeps the .invoke(prompt) interface of the wrapped model and adds:
+- a per-call deadline
+- retries with exponential backoff and full jitter, for transient errors
+  only (timeouts, connection errors, 5xx, 429)
+- optional hedging: a duplicate request is fired once the first one has
+  been running longer than the observed p95 latency, first answer wins
+- a circuit breaker that fails fast while the provider keeps failing
+- optional admission through an LLMScheduler (rate limits, priorities,
+  several API keys), see llm_scheduler.py
+
+StubChatModel is a local stand-in with injectable latency and failures,
+so the wrapper can be exercised without calling Groq (see
+tests/test_llm_resilience.py, or the demo: python llm_resilience.py).
+"""
+import os
+import time
+import random
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, Optional
+
+from llm_scheduler import LLMScheduler, estimate_tokens, error_status, rate_limit_retry_after
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1") == "1"
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+# Calls run on these threads so the caller can stop waiting at the deadline.
+# A call that misses its deadline keeps its thread until the provider answers.
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_CALL_THREADS", "64")),
+                               thread_name_prefix="llm-call")
+
+
+def _submit(fn, *args):
+    # Run in a copy of the caller's context so LangChain callbacks and
+    # tracing set up around graph.invoke() still see the call
+    return _executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the provider while the circuit is open."""
+
+
+class LLMTimeoutError(TimeoutError):
+    """Raised when no response arrived before the call deadline."""
+
+
+# Provider SDK errors (groq / openai clients) that are worth retrying
+TRANSIENT_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "InternalServerError", "RateLimitError"}
+
+
+def is_transient(error: Exception) -> bool:
+    """Timeouts, connection errors, 5xx and 429 are retried; anything else
+    (auth, bad request, validation) would fail the same way again."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in TRANSIENT_ERROR_NAMES:
+        return True
+    status = error_status(error)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures.
+    open -> half_open after `reset_timeout` seconds; one trial call is let
+    through and its outcome closes or re-opens the circuit. An outcome that
+    says nothing about the provider's health (record_neutral) just lets the
+    next call be the trial.
+    """
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_THRESHOLD, reset_timeout: float = LLM_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def record_neutral(self) -> None:
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, latency: float) -> None:
+        with self._lock:
+            self._samples.append(latency)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class ResilientLLM:
+    def __init__(self, model, name: str = "llm", timeout: float = LLM_TIMEOUT,
+                 max_retries: int = LLM_MAX_RETRIES, backoff_base: float = 0.5,
+                 backoff_max: float = 8.0, hedge: bool = LLM_HEDGE,
+                 hedge_min_samples: int = 20, breaker: Optional[CircuitBreaker] = None,
+                 latencies: Optional[LatencyTracker] = None,
+                 scheduler: Optional[LLMScheduler] = None):
+        """
+        model: anything with .invoke(prompt), or a list of them, one per API key
+        breaker: share one breaker between wrappers that hit the same provider
+        hedge_min_samples: no hedging until this many latencies were observed
+        scheduler: when set, every request (hedges included) waits for quota
+            and the scheduler picks which API key / model to use
+        """
+        self.models = list(model) if isinstance(model, (list, tuple)) else [model]
+        self.model = self.models[0]
+        self.scheduler = scheduler
+        self.name = name
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = latencies or LatencyTracker()
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0, "retries": 0, "timeouts": 0, "failures": 0,
+            "hedges": 0, "hedge_wins": 0, "circuit_rejections": 0, "rate_limited": 0,
+        }
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def hedge_delay(self) -> Optional[float]:
+        """p95 of recent latencies, or None while hedging is off / warming up."""
+        if not self.hedge or len(self.latencies) < self.hedge_min_samples:
+            return None
+        return self.latencies.percentile(95)
+
+    def _timed_invoke(self, prompt, kwargs, key):
+        start = time.perf_counter()
+        try:
+            response = self.models[key % len(self.models)].invoke(prompt, **kwargs)
+        except Exception as e:
+            retry_after = rate_limit_retry_after(e)
+            if retry_after is not None and self.scheduler is not None:
+                self.scheduler.penalize(key, retry_after)
+            raise
+        self.latencies.add(time.perf_counter() - start)
+        return response
+
+    def _call_with_deadline(self, prompt, kwargs, key, tokens):
+        deadline = time.monotonic() + self.timeout
+        primary = _submit(self._timed_invoke, prompt, kwargs, key)
+        futures = [primary]
+
+        delay = self.hedge_delay()
+        if delay is not None and delay < self.timeout:
+            done, _ = wait(futures, timeout=delay)
+            if not done:
+                # a hedge is only worth sending if it does not have to queue for quota
+                hedge_key = self.scheduler.try_acquire(tokens) if self.scheduler else key
+                if hedge_key is not None:
+                    self._count("hedges")
+                    futures.append(_submit(self._timed_invoke, prompt, kwargs, hedge_key))
+
+        error = None
+        pending = set(futures)
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+
+        if pending:
+            self._count("timeouts")
+            raise LLMTimeoutError(f"{self.name}: no response within {self.timeout}s")
+        raise error
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter: uniform(0, min(cap, base * 2^attempt))
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def invoke(self, prompt, **kwargs):
+        self._count("calls")
+        last_error = None
+        tokens = estimate_tokens(prompt) if self.scheduler else 0
+
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                self._count("circuit_rejections")
+                raise CircuitOpenError(f"{self.name}: circuit open, provider is failing") from last_error
+
+            # Waiting for quota happens before the deadline starts
+            key = self.scheduler.acquire(tokens) if self.scheduler else 0
+
+            try:
+                response = self._call_with_deadline(prompt, kwargs, key, tokens)
+            except Exception as e:
+                if not is_transient(e):
+                    # the provider answered; retrying would fail the same way
+                    self.breaker.record_neutral()
+                    self._count("failures")
+                    raise
+                if rate_limit_retry_after(e) is None:
+                    self.breaker.record_failure()
+                else:
+                    # throttled, not down: the scheduler already paused this key,
+                    # and a half-open trial must not stay in flight forever
+                    self.breaker.record_neutral()
+                    self._count("rate_limited")
+                last_error = e
+                if attempt < self.max_retries:
+                    self._count("retries")
+                    time.sleep(self._backoff(attempt))
+                continue
+
+            self.breaker.record_success()
+            return response
+
+        self._count("failures")
+        raise last_error
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            report = dict(self._stats)
+        p50 = self.latencies.percentile(50)
+        p95 = self.latencies.percentile(95)
+        report["p50_s"] = round(p50, 4) if p50 is not None else None
+        report["p95_s"] = round(p95, 4) if p95 is not None else None
+        report["circuit"] = self.breaker.state
+        return report
+
+
+class StubMessage:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class StubProviderError(RuntimeError):
+    """What StubChatModel raises; carries an HTTP status like the SDK errors do."""
+
+    def __init__(self, status_code: int = 503, message: str = "stub provider error"):
+        super().__init__(f"{message} ({status_code})")
+        self.status_code = status_code
+
+
+class StubChatModel:
+    """
+    Local stand-in for a chat model.
+
+    latency: base seconds per call
+    slow_rate / slow_latency: share of calls that take slow_latency instead
+    failure_rate / failure_status: share of calls that raise StubProviderError
+        with that HTTP status
+    script: outcomes for the first calls, in order, before the random ones
+        apply: a latency in seconds, an exception to raise, or
+        (latency, exception)
+    """
+
+    def __init__(self, content: str = '{"score": 7, "explanation": "Stub response."}',
+                 latency: float = 0.05, slow_rate: float = 0.0, slow_latency: float = 2.0,
+                 failure_rate: float = 0.0, failure_status: int = 503,
+                 script: Optional[list] = None, seed: Optional[int] = None):
+        self.content = content
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.script = deque(script or [])
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _next_outcome(self):
+        with self._lock:
+            self.calls += 1
+            if self.script:
+                outcome = self.script.popleft()
+                if isinstance(outcome, tuple):
+                    return outcome
+                if isinstance(outcome, BaseException):
+                    return self.latency, outcome
+                return outcome, None
+            slow = self._random.random() < self.slow_rate
+            fail = self._random.random() < self.failure_rate
+        error = StubProviderError(self.failure_status) if fail else None
+        return (self.slow_latency if slow else self.latency), error
+
+    def invoke(self, prompt, **kwargs):
+        latency, error = self._next_outcome()
+        time.sleep(latency)
+        if error is not None:
+            raise error
+        return StubMessage(self.content)
+
+
+if __name__ == "__main__":
+    def run(label, llm, n=300):
+        latencies = []
+        for _ in range(n):
+            start = time.perf_counter()
+            llm.invoke("ping")
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        print(f"{label:>10}: p50={p50 * 1000:.0f}ms p99={p99 * 1000:.0f}ms max={latencies[-1] * 1000:.0f}ms")
+
+    run("direct", StubChatModel(slow_rate=0.02, slow_latency=1.0, seed=1))
+    hedged = ResilientLLM(StubChatModel(slow_rate=0.02, slow_latency=1.0, seed=1), name="stub")
+    run("hedged", hedged)
+    print("   stats:", hedged.stats())
+
+    flaky = ResilientLLM(StubChatModel(failure_rate=1.0), name="down", max_retries=1,
+                         backoff_base=0.01, breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60))
+    for _ in range(4):
+        try:
+            flaky.invoke("ping")
+        except Exception as e:
+            print(f"{'down':>10}: {type(e).__name__}: {e}")
@@ -0,0 +1,177 @@
+# llm_router.py
+"""
+Tiered model routing for the evaluation agents.
+
+Each agent has a policy listing the model tiers to try, cheapest first.
+A call escalates to the next tier when the cheaper tier raises, the
+answer fails to parse or its score falls inside the policy's borderline band.
+
+Policy format (per agent name or fnmatch pattern such as "skill_*"):
+    {"tiers": ["small", "large"], "borderline": [4, 6]}
+"""
+import os
+import json
+import time
+import threading
+from fnmatch import fnmatch
+from typing import Any, Callable, Dict, Optional, Tuple
+
+DEFAULT_ROUTING_POLICY: Dict[str, Dict[str, Any]] = {
+    # narrow checks: try the fast model, escalate when unsure
+    "skill_*": {"tiers": ["small", "large"], "borderline": [4, 6]},
+    "culture_fit": {"tiers": ["small", "large"], "borderline": [4, 6]},
+    # anything else goes straight to the large model
+    "*": {"tiers": ["large"]},
+}
+
+
+def load_routing_policy() -> Dict[str, Dict[str, Any]]:
+    """
+    Default policy, overridden per key by the MODEL_ROUTING_POLICY env var
+    (a JSON object in the same format). Override entries come first, so an
+    override pattern such as "skill_python*" wins over the default "skill_*".
+    """
+    override = os.getenv("MODEL_ROUTING_POLICY")
+    policy = dict(json.loads(override)) if override else {}
+    for pattern, entry in DEFAULT_ROUTING_POLICY.items():
+        policy.setdefault(pattern, entry)
+    return policy
+
+
+class ModelRouter:
+    def __init__(self, tiers: Dict[str, Any], policy: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        tiers: tier name -> chat model (anything with .invoke(prompt))
+        policy: agent name / pattern -> routing policy
+        """
+        self.tiers = tiers
+        self.policy = policy if policy is not None else load_routing_policy()
+        self._lock = threading.Lock()
+        self._stats = {
+            name: {"calls": 0, "latency_total": 0.0, "errors": 0, "parse_failures": 0, "escalations": 0}
+            for name in tiers
+        }
+
+    def set_policy(self, agent_pattern: str, tiers: list, borderline: Optional[list] = None) -> None:
+        """Add or replace a policy; it takes precedence over existing patterns."""
+        entry = {"tiers": tiers}
+        if borderline is not None:
+            entry["borderline"] = borderline
+        with self._lock:
+            rest = {k: v for k, v in self.policy.items() if k != agent_pattern}
+            self.policy = {agent_pattern: entry, **rest}
+
+    def policy_for(self, agent_name: str) -> Dict[str, Any]:
+        """Exact agent name wins, then the first matching pattern, then "*"."""
+        with self._lock:
+            if agent_name in self.policy:
+                return self.policy[agent_name]
+            for pattern, entry in self.policy.items():
+                if pattern != "*" and fnmatch(agent_name, pattern):
+                    return entry
+            if "*" in self.policy:
+                return self.policy["*"]
+        return {"tiers": [next(reversed(self.tiers))]}
+
+    def _record(self, tier: str, latency: float, parse_failed: bool, escalated: bool,
+                error: bool = False) -> None:
+        with self._lock:
+            stats = self._stats[tier]
+            stats["calls"] += 1
+            stats["latency_total"] += latency
+            if error:
+                stats["errors"] += 1
+            elif parse_failed:
+                stats["parse_failures"] += 1
+            if escalated:
+                stats["escalations"] += 1
+
+    @staticmethod
+    def _is_borderline(result: dict, band) -> bool:
+        if not band:
+            return False
+        low, high = band
+        try:
+            score = int(result.get("score"))
+        except (TypeError, ValueError):
+            return True
+        return low <= score <= high
+
+    def invoke(self, agent_name: str, prompt: str,
+               parse: Callable[[Any], Optional[dict]]) -> Tuple[Optional[dict], Any]:
+        """
+        Run the prompt through the agent's tier chain.
+
+        Returns (parsed result or None, last raw response). The parsed
+        result carries a "model_tier" key naming the tier that answered.
+        """
+        policy = self.policy_for(agent_name)
+        chain = [t for t in policy.get("tiers", []) if t in self.tiers]
+        if not chain:
+            raise ValueError(f"No usable model tier for agent '{agent_name}'")
+        band = policy.get("borderline")
+
+        result, response = None, None
+        for position, tier in enumerate(chain):
+            is_last = position == len(chain) - 1
+
+            start = time.perf_counter()
+            try:
+                response = self.tiers[tier].invoke(prompt)
+            except Exception:
+                # a failing cheaper tier (timeout, open breaker, ...) is
+                # treated like an unusable answer: the next tier gets the call
+                self._record(tier, time.perf_counter() - start, parse_failed=False,
+                             escalated=not is_last, error=True)
+                if is_last:
+                    raise
+                continue
+            latency = time.perf_counter() - start
+
+            parsed = parse(response)
+            escalate = not is_last and (parsed is None or self._is_borderline(parsed, band))
+            self._record(tier, latency, parse_failed=parsed is None, escalated=escalate)
+
+            if parsed is not None:
+                result = {**parsed, "model_tier": tier}
+            if not escalate:
+                break
+            # a borderline answer from the cheaper tier is discarded in favour of the next one
+            result = None
+
+        return result, response
+
+    def invoke_tier(self, tier: str, prompt: str,
+                    parse: Callable[[Any], Optional[dict]]) -> Tuple[Optional[dict], Any]:
+        """
+        One call to a single tier, outside any policy (e.g. a re-ask),
+        counted in the tier's stats like routed calls.
+        """
+        start = time.perf_counter()
+        try:
+            response = self.tiers[tier].invoke(prompt)
+        except Exception:
+            self._record(tier, time.perf_counter() - start, parse_failed=False, escalated=False, error=True)
+            raise
+        latency = time.perf_counter() - start
+
+        parsed = parse(response)
+        self._record(tier, latency, parse_failed=parsed is None, escalated=False)
+        return ({**parsed, "model_tier": tier} if parsed is not None else None), response
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-tier call share, latency and escalation counts."""
+        with self._lock:
+            total_calls = sum(s["calls"] for s in self._stats.values())
+            report = {}
+            for tier, s in self._stats.items():
+                report[tier] = {
+                    "calls": s["calls"],
+                    "share": round(s["calls"] / total_calls, 4) if total_calls else 0.0,
+                    "avg_latency_s": round(s["latency_total"] / s["calls"], 4) if s["calls"] else 0.0,
+                    "total_latency_s": round(s["latency_total"], 4),
+                    "errors": s["errors"],
+                    "parse_failures": s["parse_failures"],
+                    "escalations": s["escalations"],
+                }
+            return {"total_calls": total_calls, "tiers": report}
@@ -0,0 +1,281 @@
+# llm_scheduler.py
+"""
+Process-wide admission control for LLM calls.
+
+Every call estimates its token cost and waits for quota from a token
+bucket (tokens per minute + requests per minute) before it is sent. With
+several API keys each key has its own buckets and a call takes whichever
+key can serve it first.
+
+Waiting calls are served strictly by priority class, FIFO within a class:
+interactive requests (single uploads) always go ahead of batch scans. Batch
+calls also leave a slice of every bucket untouched (LLM_INTERACTIVE_RESERVE),
+so a big batch fills the quota without making the UI wait for a refill.
+
+    with llm_priority(BATCH):
+        graph.invoke(state)   # every agent call inside is scheduled as batch
+
+Limits are given for the whole API key, but buckets live in one process.
+Each scheduler therefore uses 1/N of them, N being the number of server
+processes (WEB_CONCURRENCY, which gunicorn.conf.py exports and re-applies
+in every worker via set_quota_shares).
+"""
+import os
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+# Budgeted for the reply as well, since providers count prompt + completion
+LLM_COMPLETION_TOKENS = int(os.getenv("LLM_COMPLETION_TOKENS", "150"))
+# Share of each bucket only interactive calls may use
+LLM_INTERACTIVE_RESERVE = float(os.getenv("LLM_INTERACTIVE_RESERVE", "0.1"))
+
+# Processes sharing the API keys' quota (the gunicorn workers)
+LLM_QUOTA_SHARES = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+# LangGraph copies the context into its node threads, so the priority set
+# around graph.invoke() reaches every agent
+_priority: ContextVar[int] = ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority: int):
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+_encoding = None
+
+
+def estimate_tokens(prompt: Any) -> int:
+    """Prompt tokens (tiktoken cl100k, ~4 chars/token without it) plus the reply budget."""
+    global _encoding
+    text = prompt if isinstance(prompt, str) else str(prompt)
+    try:
+        if _encoding is None:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        prompt_tokens = len(_encoding.encode(text))
+    except Exception:
+        prompt_tokens = len(text) // 4 + 1
+    return prompt_tokens + LLM_COMPLETION_TOKENS
+
+
+class TokenBucket:
+    """Refills continuously at `per_minute / 60` per second up to `per_minute`."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float, reserve: float = 0.0) -> float:
+        """Seconds until `amount` can be taken while leaving `reserve` (a share of capacity) in the bucket."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        needed = min(amount + reserve * self.capacity, self.capacity)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+    def resize(self, per_minute: float) -> None:
+        self._refill(time.monotonic())
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = min(self.level, self.capacity)
+
+
+class _KeyQuota:
+    def __init__(self, tokens_per_minute: float, requests_per_minute: float):
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.requests = TokenBucket(requests_per_minute)
+        self.blocked_until = 0.0
+        self.tokens_granted = 0
+        self.requests_granted = 0
+        self.rate_limited = 0
+
+    def wait_time(self, tokens: int, now: float, reserve: float) -> float:
+        return max(self.blocked_until - now,
+                   self.tokens.wait_time(tokens, now, reserve),
+                   self.requests.wait_time(1, now, reserve))
+
+    def consume(self, tokens: int) -> None:
+        self.tokens.consume(tokens)
+        self.requests.consume(1)
+        self.tokens_granted += tokens
+        self.requests_granted += 1
+
+
+class LLMScheduler:
+    def __init__(self, name: str, n_keys: int = 1, tokens_per_minute: float = 6000,
+                 requests_per_minute: float = 30, interactive_reserve: float = LLM_INTERACTIVE_RESERVE,
+                 quota_shares: int = LLM_QUOTA_SHARES):
+        """
+        tokens_per_minute / requests_per_minute: limits of one API key
+        quota_shares: processes splitting those limits; this one gets 1/quota_shares
+        """
+        self.name = name
+        self.interactive_reserve = interactive_reserve
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self.quota_shares = max(1, int(quota_shares))
+        self._keys = [_KeyQuota(tokens_per_minute / self.quota_shares, requests_per_minute / self.quota_shares)
+                      for _ in range(n_keys)]
+        self._cond = threading.Condition()
+        self._queue = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._waits = {p: deque(maxlen=500) for p in PRIORITY_NAMES}
+        self._granted = {p: 0 for p in PRIORITY_NAMES}
+
+    def set_quota_shares(self, shares: int) -> None:
+        """Re-split the key limits, e.g. once the actual worker count is known."""
+        with self._cond:
+            self.quota_shares = max(1, int(shares))
+            for quota in self._keys:
+                quota.tokens.resize(self.tokens_per_minute / self.quota_shares)
+                quota.requests.resize(self.requests_per_minute / self.quota_shares)
+            self._cond.notify_all()
+
+    def _best_key(self, tokens: int, priority: int, now: float):
+        """(key index, seconds until it can serve `tokens`) for the soonest key."""
+        reserve = self.interactive_reserve if priority != INTERACTIVE else 0.0
+        waits = [quota.wait_time(tokens, now, reserve) for quota in self._keys]
+        index = min(range(len(waits)), key=waits.__getitem__)
+        return index, waits[index]
+
+    def _grant(self, key: int, tokens: int, priority: int, waited: float) -> int:
+        self._keys[key].consume(tokens)
+        self._granted[priority] += 1
+        self._waits[priority].append(waited)
+        return key
+
+    def acquire(self, tokens: int, priority: Optional[int] = None) -> int:
+        """Block until quota is available; returns the API key index to use."""
+        if priority is None:
+            priority = current_priority()
+        entry = (priority, next(self._seq))
+        start = time.monotonic()
+
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    if self._queue[0] == entry:
+                        now = time.monotonic()
+                        key, wait = self._best_key(tokens, priority, now)
+                        if wait <= 0:
+                            heapq.heappop(self._queue)
+                            self._cond.notify_all()
+                            return self._grant(key, tokens, priority, now - start)
+                        self._cond.wait(timeout=wait)
+                    else:
+                        self._cond.wait()
+            except BaseException:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                    self._cond.notify_all()
+                raise
+
+    def try_acquire(self, tokens: int, priority: Optional[int] = None) -> Optional[int]:
+        """Take quota only if it is free right now and nobody is queued (used for hedges)."""
+        if priority is None:
+            priority = current_priority()
+        with self._cond:
+            if self._queue:
+                return None
+            key, wait = self._best_key(tokens, priority, time.monotonic())
+            if wait > 0:
+                return None
+            return self._grant(key, tokens, priority, 0.0)
+
+    def penalize(self, key: int, retry_after: Optional[float] = None) -> None:
+        """The provider answered 429 on this key: pause it and drain its buckets."""
+        with self._cond:
+            quota = self._keys[key]
+            quota.rate_limited += 1
+            quota.tokens.level = min(quota.tokens.level, 0.0)
+            quota.blocked_until = max(quota.blocked_until, time.monotonic() + (retry_after or 5.0))
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._queue:
+                depth[PRIORITY_NAMES[priority]] += 1
+
+            waits = {}
+            for priority, samples in self._waits.items():
+                ordered = sorted(samples)
+                waits[PRIORITY_NAMES[priority]] = {
+                    "granted": self._granted[priority],
+                    "avg_wait_s": round(sum(ordered) / len(ordered), 4) if ordered else 0.0,
+                    "p95_wait_s": round(ordered[int(len(ordered) * 0.95) - 1], 4) if len(ordered) >= 20 else None,
+                    "max_wait_s": round(ordered[-1], 4) if ordered else 0.0,
+                }
+
+            keys = [
+                {
+                    "tokens_granted": q.tokens_granted,
+                    "requests_granted": q.requests_granted,
+                    "rate_limited": q.rate_limited,
+                    "tokens_available": round(q.tokens.level, 1),
+                }
+                for q in self._keys
+            ]
+            return {
+                "quota_shares": self.quota_shares,
+                "tokens_per_minute": round(self.tokens_per_minute / self.quota_shares, 1),
+                "requests_per_minute": round(self.requests_per_minute / self.quota_shares, 2),
+                "queue_depth": depth,
+                "waits": waits,
+                "keys": keys,
+            }
+
+
+def error_status(error: Exception) -> Optional[int]:
+    """HTTP status carried by a provider SDK error, if any."""
+    status = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+    return status
+
+
+def rate_limit_retry_after(error: Exception) -> Optional[float]:
+    """
+    If the error is a provider 429, the Retry-After delay in seconds
+    (0.0 when the header is missing); None for any other error.
+    """
+    if error_status(error) != 429 and type(error).__name__ != "RateLimitError":
+        return None
+
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
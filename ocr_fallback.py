@@ -0,0 +1,337 @@
+# ocr_fallback.py
+"""
+OCR fallback for scanned PDFs.
+
+Pages without a text layer are OCR'd with Tesseract in a shared process
+pool (one task per page). Every page gets one deadline; a page that misses
+it comes back empty and the pool is replaced, so a hung worker never keeps
+its slot. Other callers' pages that were running in the replaced pool are
+resubmitted to the new one rather than lost. Results are cached by a hash
+of the page's embedded images, so the same scan is never OCR'd twice;
+cache files untouched for OCR_CACHE_TTL seconds, and the oldest ones beyond
+OCR_CACHE_MAX_FILES, are pruned.
+"""
+import io
+import os
+import sys
+import time
+import hashlib
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, CancelledError, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Dict, List, Optional
+
+import pytesseract
+
+# A page (all of its images) gets this many seconds once a worker picks it up
+OCR_PAGE_TIMEOUT = float(os.getenv("OCR_PAGE_TIMEOUT", "30"))
+OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", str(os.cpu_count() or 2)))
+# Extra time for image decoding / process overhead before a page counts as hung
+OCR_DEADLINE_GRACE = 5.0
+# How often a page killed by someone else's pool reset is resubmitted
+OCR_MAX_RESUBMITS = 2
+# Set OCR_CACHE_DIR="" to keep the cache in memory only
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", os.path.join(tempfile.gettempdir(), "resume_ocr_cache"))
+OCR_CACHE_TTL = float(os.getenv("OCR_CACHE_TTL", str(30 * 24 * 3600)))
+OCR_CACHE_MAX_FILES = int(os.getenv("OCR_CACHE_MAX_FILES", "10000"))
+OCR_MEMORY_CACHE_SIZE = int(os.getenv("OCR_MEMORY_CACHE_SIZE", "1000"))
+# The disk cache is pruned once every this many writes
+OCR_CACHE_PRUNE_EVERY = 100
+
+_pool = None
+_pool_lock = threading.Lock()
+# One slot per pool worker, shared by all callers: a page is only submitted
+# when a worker is free, so its deadline starts when it actually runs
+_slots = threading.BoundedSemaphore(OCR_MAX_WORKERS)
+# Pools killed on purpose because a page hung; their other pages were collateral
+_killed_pools = weakref.WeakSet()
+
+_memory_cache: "OrderedDict[str, str]" = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_writes = 0
+
+
+def page_needs_ocr(text) -> bool:
+    """A page needs OCR when pypdf found no text layer on it."""
+    return not text or not text.strip()
+
+
+def page_images(page) -> List[bytes]:
+    try:
+        return [image.data for image in page.images]
+    except Exception:
+        # Broken or unsupported image filters, nothing we can OCR
+        return []
+
+
+def page_content_hash(images: List[bytes]) -> str:
+    digest = hashlib.sha256()
+    for blob in images:
+        digest.update(len(blob).to_bytes(8, "big"))
+        digest.update(blob)
+    return digest.hexdigest()
+
+
+def _remember(key: str, text: str) -> None:
+    """Keep text in the in-memory LRU; the caller holds _cache_lock."""
+    _memory_cache[key] = text
+    _memory_cache.move_to_end(key)
+    while len(_memory_cache) > OCR_MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+
+
+def _cache_get(key: str):
+    with _cache_lock:
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return _memory_cache[key]
+
+    if OCR_CACHE_DIR:
+        path = os.path.join(OCR_CACHE_DIR, f"{key}.txt")
+        try:
+            if time.time() - os.path.getmtime(path) > OCR_CACHE_TTL:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            # a hit keeps the file from being pruned as stale
+            os.utime(path)
+        except OSError:
+            return None
+        with _cache_lock:
+            _remember(key, text)
+        return text
+
+    return None
+
+
+def _prune_cache() -> None:
+    """Drop expired cache files, then the oldest ones beyond OCR_CACHE_MAX_FILES."""
+    entries = []
+    for name in os.listdir(OCR_CACHE_DIR):
+        if not name.endswith(".txt"):
+            continue
+        path = os.path.join(OCR_CACHE_DIR, name)
+        try:
+            entries.append((os.path.getmtime(path), path))
+        except OSError:
+            continue
+    entries.sort(reverse=True)
+
+    now = time.time()
+    for position, (mtime, path) in enumerate(entries):
+        if position >= OCR_CACHE_MAX_FILES or now - mtime > OCR_CACHE_TTL:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _cache_put(key: str, text: str) -> None:
+    global _cache_writes
+    with _cache_lock:
+        _remember(key, text)
+        _cache_writes += 1
+        prune = _cache_writes % OCR_CACHE_PRUNE_EVERY == 1
+
+    if OCR_CACHE_DIR:
+        os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+        path = os.path.join(OCR_CACHE_DIR, f"{key}.txt")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+        if prune:
+            _prune_cache()
+
+
+def _ocr_page_images(images: List[bytes], timeout: float) -> str:
+    """
+    Worker function (runs in the process pool).
+    OCRs every image embedded in one page and joins the text; all images
+    share the page's `timeout`.
+    """
+    from PIL import Image
+
+    deadline = time.monotonic() + timeout
+    texts = []
+    for blob in images:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise RuntimeError("Tesseract process timeout")
+        try:
+            with Image.open(io.BytesIO(blob)) as img:
+                texts.append(pytesseract.image_to_string(img, timeout=remaining))
+        except Exception as e:
+            # Some pytesseract errors (e.g. TesseractNotFoundError) cannot be
+            # unpickled and would break the whole pool on the way back
+            raise RuntimeError(f"{type(e).__name__}: {e}") from None
+    return "\n".join(t.strip() for t in texts if t and t.strip())
+
+
+def _mp_context():
+    import multiprocessing
+    # same start method as document_parsing: workers must not be forked from
+    # a (possibly multi-threaded) web worker
+    if sys.platform.startswith("linux"):
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload([__name__])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=OCR_MAX_WORKERS, mp_context=_mp_context())
+        return _pool
+
+
+def _reset_pool(pool: ProcessPoolExecutor) -> None:
+    """Replace `pool` unless another caller already did."""
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            return
+        # shutdown() does not stop a running task, so a hung worker is killed
+        _killed_pools.add(pool)
+        for process in list((pool._processes or {}).values()):
+            process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _page_done(key: str, future) -> None:
+    _slots.release()
+    # pages finishing after their caller gave up are still cached
+    if not future.cancelled() and future.exception() is None:
+        _cache_put(key, future.result())
+
+
+def _submit_page(key: str, images: List[bytes], page_timeout: float):
+    """
+    Submit one page; the caller holds a slot, released when the page
+    finishes. Returns (future, pool it runs in).
+    """
+    pool = _get_pool()
+    try:
+        future = pool.submit(_ocr_page_images, images, page_timeout)
+    except (BrokenProcessPool, RuntimeError):
+        # a worker crashed, or another caller replaced the pool meanwhile
+        _reset_pool(pool)
+        pool = _get_pool()
+        try:
+            future = pool.submit(_ocr_page_images, images, page_timeout)
+        except BaseException:
+            _slots.release()
+            raise
+    future.add_done_callback(partial(_page_done, key))
+    return future, pool
+
+
+def _killed_by_reset(future, pool) -> bool:
+    """The page did nothing wrong: its pool was replaced because another page hung."""
+    if pool not in _killed_pools:
+        return False
+    return future.cancelled() or isinstance(future.exception(), BrokenProcessPool)
+
+
+def _page_text(future, index: int) -> str:
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        print(f"[WARN] OCR worker crashed on page {index + 1}")
+    except CancelledError:
+        print(f"[WARN] OCR cancelled for page {index + 1}")
+    except Exception as e:
+        # pytesseract raises RuntimeError on its own timeout
+        print(f"[WARN] OCR failed for page {index + 1}: {e}")
+    return ""
+
+
+def ocr_pages(pages: Dict[int, List[bytes]], page_timeout: float = OCR_PAGE_TIMEOUT,
+              budget: Optional[float] = None) -> Dict[int, str]:
+    """
+    OCR pages in parallel, given as {page_index: embedded images}
+    (see page_images()).
+
+    budget: seconds for the whole call. Pages not finished by then come
+    back empty; the ones already running keep going and are cached.
+
+    Returns {page_index: text}. Pages that time out, fail or have no
+    embedded images come back as "" and are not cached.
+    """
+    results: Dict[int, str] = {}
+    queue = deque()
+
+    for index, images in pages.items():
+        if not images:
+            results[index] = ""
+            continue
+
+        key = page_content_hash(images)
+        cached = _cache_get(key)
+        if cached is not None:
+            results[index] = cached
+        else:
+            queue.append((index, key, images, 0))
+
+    budget_deadline = time.monotonic() + budget if budget is not None else None
+    running = {}  # future -> (page index, deadline, pool, (key, images, resubmits))
+    while queue or running:
+        if budget_deadline is not None and time.monotonic() >= budget_deadline:
+            break
+
+        # Start queued pages on free workers; block for one only when
+        # nothing of ours is running
+        while queue:
+            if running:
+                acquired = _slots.acquire(blocking=False)
+            elif budget_deadline is not None:
+                acquired = _slots.acquire(timeout=max(0.0, budget_deadline - time.monotonic()))
+            else:
+                acquired = _slots.acquire()
+            if not acquired:
+                break
+            index, key, images, resubmits = queue.popleft()
+            future, pool = _submit_page(key, images, page_timeout)
+            deadline = time.monotonic() + page_timeout + OCR_DEADLINE_GRACE
+            running[future] = (index, deadline, pool, (key, images, resubmits))
+
+        if not running:
+            continue
+        wake = min(deadline for _, deadline, _, _ in running.values())
+        if budget_deadline is not None:
+            wake = min(wake, budget_deadline)
+        if queue:
+            # slots freed by other callers are not signalled, poll for them
+            wake = min(wake, time.monotonic() + 0.1)
+        done, _ = wait(running, timeout=max(0.0, wake - time.monotonic()), return_when=FIRST_COMPLETED)
+
+        for future in done:
+            index, _, pool, (key, images, resubmits) = running.pop(future)
+            if _killed_by_reset(future, pool) and resubmits < OCR_MAX_RESUBMITS:
+                # start it again on the new pool, ahead of our other pages
+                queue.appendleft((index, key, images, resubmits + 1))
+                continue
+            results[index] = _page_text(future, index)
+
+        now = time.monotonic()
+        hung = [future for future, (_, deadline, _, _) in running.items() if now >= deadline]
+        for future in hung:
+            index, _, pool, _ = running.pop(future)
+            print(f"[WARN] OCR timed out for page {index + 1}")
+            results[index] = ""
+            _reset_pool(pool)
+
+    unfinished = [entry[0] for entry in queue] + [entry[0] for entry in running.values()]
+    for index in unfinished:
+        results[index] = ""
+    if unfinished:
+        print(f"[WARN] OCR budget of {budget:.0f}s spent, {len(unfinished)} page(s) left without text")
+
+    return results
@@ -0,0 +1,115 @@
+# scoring.py
+"""
+Weighted aggregation of agent scores.
+
+Weights map agent names (or fnmatch patterns like "skill_*") to a
+multiplier; agents without a weight count 1.0. The final score is the
+weighted mean of the agent scores, so all-ones weights give the plain
+average the aggregator always used.
+
+    {"jd_match": 3, "culture_fit": 0.5, "skill_*": 1}
+
+Weights must be finite numbers >= 0 and not all zero (validate_weights).
+rerank() applies new weights to stored breakdowns of a whole batch at
+once, without re-running any agent.
+"""
+import os
+import json
+import math
+from fnmatch import fnmatch
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def validate_weights(weights: Any) -> Optional[Dict[str, float]]:
+    """
+    Check client-supplied weights before any work is done.
+    Returns them as floats (None stays None); raises ValueError otherwise.
+    """
+    if weights is None:
+        return None
+    if not isinstance(weights, dict):
+        raise ValueError("weights must be an object mapping agent names to numbers")
+
+    checked = {}
+    for name, weight in weights.items():
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)):
+            raise ValueError(f"weight for '{name}' must be a number, got {weight!r}")
+        if not math.isfinite(weight) or weight < 0:
+            raise ValueError(f"weight for '{name}' must be a finite number >= 0, got {weight!r}")
+        checked[str(name)] = float(weight)
+
+    # agents without a weight count checked["*"] (1.0 unless set)
+    if checked.get("*", 1.0) == 0 and all(weight == 0 for weight in checked.values()):
+        raise ValueError("weights are all zero, every score would be 0")
+    return checked
+
+
+# Default weights for new graphs, e.g. AGENT_WEIGHTS='{"jd_match": 3}'
+DEFAULT_AGENT_WEIGHTS: Dict[str, float] = validate_weights(json.loads(os.getenv("AGENT_WEIGHTS", "{}")))
+
+
+def resolve_weight(agent_name: str, weights: Optional[Dict[str, float]]) -> float:
+    """Exact agent name wins, then the first matching pattern, then "*", then 1.0."""
+    if not weights:
+        return 1.0
+    if agent_name in weights:
+        return float(weights[agent_name])
+    for pattern, weight in weights.items():
+        if pattern != "*" and fnmatch(agent_name, pattern):
+            return float(weight)
+    return float(weights.get("*", 1.0))
+
+
+def weighted_score(breakdown: Dict[str, float], weights: Optional[Dict[str, float]]) -> float:
+    """Weighted mean of one breakdown, rounded like the aggregator output."""
+    total = 0.0
+    total_weight = 0.0
+    for agent_name, score in breakdown.items():
+        weight = resolve_weight(agent_name, weights)
+        total += weight * score
+        total_weight += weight
+    return round(total / total_weight, 2) if total_weight > 0 else 0
+
+
+def rerank(breakdowns: List[Dict[str, float]], weights: Optional[Dict[str, float]],
+           excluded: Optional[Sequence[bool]] = None):
+    """
+    Score many stored breakdowns under new weights.
+
+    Breakdowns become an (n_candidates, n_agents) score matrix plus a
+    presence mask, so candidates that were not scored by some agent are
+    averaged over the agents they have. Numerator and denominator of every
+    weighted mean come out of a single matrix-vector product.
+
+    excluded marks candidates that were never evaluated (auto-filtered):
+    they score 0 and rank after everyone else whatever their breakdown.
+
+    Returns (scores, order): scores in input order and the indices that
+    sort them best-first.
+    """
+    agent_names = sorted({name for breakdown in breakdowns for name in breakdown})
+    column = {name: j for j, name in enumerate(agent_names)}
+
+    n, k = len(breakdowns), len(agent_names)
+    stacked = np.zeros((n, 2, k), dtype=np.float64)  # [:, 0] scores, [:, 1] presence
+    for i, breakdown in enumerate(breakdowns):
+        for name, score in breakdown.items():
+            j = column[name]
+            stacked[i, 0, j] = float(score)
+            stacked[i, 1, j] = 1.0
+
+    w = np.array([resolve_weight(name, weights) for name in agent_names], dtype=np.float64)
+    totals = stacked @ w  # (n, 2): weighted sum, weight of present agents
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = np.where(totals[:, 1] > 0, totals[:, 0] / totals[:, 1], 0.0)
+    scores = np.round(scores, 2)
+
+    excluded = np.zeros(n, dtype=bool) if excluded is None else np.asarray(excluded, dtype=bool)
+    scores = np.where(excluded, 0.0, scores)
+
+    # stable, best first, excluded last (lexsort: last key is the primary one)
+    order = np.lexsort((-scores, excluded))
+    return scores, order
@@ -0,0 +1,190 @@
+# structured_output.py
+"""
+Schema-constrained agent output.
+
+Agents ask the model for an AgentScore through tool calling / JSON mode.
+Replies are resolved in this order, and each path is counted:
+    structured  the provider returned a schema-valid object
+    direct      the raw text was valid JSON matching the schema
+    repaired    the raw text needed local repair (code fences, prose,
+                trailing commas, single quotes, ...)
+    unparsed    nothing usable in this reply
+and per agent call, when every reply was unparsed:
+    reask       a single targeted re-ask produced a valid result
+    failed      the re-ask failed too and the agent scored 0
+"""
+import re
+import ast
+import json
+import threading
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel, Field, ValidationError
+
+
+class AgentScore(BaseModel):
+    """Score returned by every evaluation agent."""
+    score: int = Field(ge=0, le=10, description="Integer score from 0 to 10")
+    explanation: str = Field(description="One short sentence justifying the score")
+
+
+PARSE_PATHS = ("structured", "direct", "repaired", "unparsed", "reask", "failed")
+
+
+class ParseStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {path: 0 for path in PARSE_PATHS}
+
+    def record(self, path: str) -> None:
+        with self._lock:
+            self._counts[path] += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+parse_stats = ParseStats()
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_SCORE_RE = re.compile(r"[\"']?score[\"']?\s*[:=]\s*[\"']?(\d{1,2})")
+_EXPLANATION_RE = re.compile(r"[\"']?explanation[\"']?\s*[:=]\s*[\"'](.+?)[\"']\s*[,}\n]", re.DOTALL)
+
+
+def validate_score(data: Any) -> Optional[dict]:
+    """Return the data as a plain dict if it matches AgentScore, else None."""
+    if isinstance(data, AgentScore):
+        return data.model_dump()
+    if not isinstance(data, dict):
+        return None
+    try:
+        return AgentScore.model_validate(data).model_dump()
+    except ValidationError:
+        return None
+
+
+def _json_candidates(text: str):
+    """Yield substrings of text that may hold the JSON object."""
+    for match in _FENCE_RE.finditer(text):
+        yield match.group(1).strip()
+
+    # every balanced {...} block, outermost first
+    decoder = json.JSONDecoder()
+    for start in [i for i, ch in enumerate(text) if ch == "{"]:
+        try:
+            _, end = decoder.raw_decode(text, start)
+            yield text[start:end]
+            continue
+        except ValueError:
+            pass
+        close = text.rfind("}")
+        if close > start:
+            yield text[start:close + 1]
+
+
+def _loads_lenient(candidate: str) -> Optional[Any]:
+    try:
+        return json.loads(candidate)
+    except ValueError:
+        pass
+
+    fixed = _TRAILING_COMMA_RE.sub(r"\1", candidate)
+    try:
+        return json.loads(fixed)
+    except ValueError:
+        pass
+
+    # single quotes / Python literals (True, None)
+    try:
+        return ast.literal_eval(fixed)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+
+def repair_json(text: str) -> Optional[dict]:
+    """Best-effort local recovery of an AgentScore from malformed model output."""
+    if not text:
+        return None
+
+    for candidate in _json_candidates(text):
+        result = validate_score(_loads_lenient(candidate))
+        if result is not None:
+            return result
+
+    # truncated or prose-only reply that still names the fields
+    score_match = _SCORE_RE.search(text)
+    if score_match:
+        explanation_match = _EXPLANATION_RE.search(text)
+        explanation = explanation_match.group(1).strip() if explanation_match else text.strip()[:300]
+        return validate_score({"score": int(score_match.group(1)), "explanation": explanation})
+
+    return None
+
+
+def response_text(response: Any) -> str:
+    """Raw text of a model reply, including tool-call arguments."""
+    if isinstance(response, dict) and "raw" in response:
+        response = response["raw"]
+    if response is None:
+        return ""
+    if isinstance(response, str):
+        return response.strip()
+
+    content = getattr(response, "content", "") or ""
+    if isinstance(content, list):
+        content = "".join(part if isinstance(part, str) else part.get("text", "") for part in content)
+    if content.strip():
+        return content.strip()
+
+    tool_calls = (getattr(response, "additional_kwargs", None) or {}).get("tool_calls") or []
+    if tool_calls:
+        return (tool_calls[0].get("function", {}).get("arguments") or "").strip()
+    return ""
+
+
+def parse_agent_response(response: Any) -> Optional[dict]:
+    """
+    Resolve one model reply to an AgentScore dict, recording the path taken.
+    Accepts structured output (include_raw dicts or AgentScore) and plain messages.
+    """
+    if isinstance(response, dict) and "parsed" in response:
+        result = validate_score(response.get("parsed"))
+        if result is not None:
+            parse_stats.record("structured")
+            return result
+    elif isinstance(response, AgentScore):
+        parse_stats.record("structured")
+        return response.model_dump()
+
+    text = response_text(response)
+    try:
+        result = validate_score(json.loads(text))
+    except ValueError:
+        result = None
+    if result is not None:
+        parse_stats.record("direct")
+        return result
+
+    result = repair_json(text)
+    if result is not None:
+        parse_stats.record("repaired")
+        return result
+
+    parse_stats.record("unparsed")
+    return None
+
+
+def build_reask_prompt(prompt: str, raw_output: str) -> str:
+    """Targeted follow-up used once when no reply could be parsed."""
+    return f"""{prompt}
+
+Your previous reply could not be parsed:
+---
+{raw_output[:2000]}
+---
+
+Reply again with ONLY a JSON object, no code fences and no other text:
+{{"score": <integer 0-10>, "explanation": "<one short sentence>"}}
+"""
@@ -23,6 +23,26 @@ def list_resumes_in_supabase(folder: str = ""):
     return result
 
 
+@traceable(name="list_all_resumes_supabase")
+def list_all_resumes_in_supabase(folder: str = "", page_size: int = 1000):
+    """
+    List every object in the folder, paging through the storage API
+    (a single list call returns at most `limit` objects, 100 by default).
+    """
+    path = folder or ""
+    objects = []
+    offset = 0
+    while True:
+        page = supabase.storage.from_(SUPABASE_BUCKET).list(
+            path=path,
+            options={"limit": page_size, "offset": offset, "sortBy": {"column": "name", "order": "asc"}}
+        )
+        objects.extend(page)
+        if len(page) < page_size:
+            return objects
+        offset += page_size
+
+
 @traceable(name="download_resume_supabase")
 def download_resume_from_supabase(storage_path: str, local_dir: str = "./temp_resumes") -> str:
     """
@@ -0,0 +1,98 @@
+import argparse
+import json
+
+import pytest
+
+from batch_scan import build_parser, in_shard, load_checkpoint, parse_shard, run_merge
+
+
+def test_parse_shard():
+    assert parse_shard("0/4") == (0, 4)
+    assert parse_shard("3/4") == (3, 4)
+    assert parse_shard("0/1") == (0, 1)
+
+
+@pytest.mark.parametrize("value", ["4/4", "-1/4", "0/0", "1", "a/b", "1/2/3"])
+def test_parse_shard_rejects_bad_values(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_shard(value)
+
+
+def test_every_path_lands_in_exactly_one_shard():
+    paths = [f"2025-11-26/resume_{n}.pdf" for n in range(200)]
+    for count in (1, 2, 3, 7):
+        for path in paths:
+            assert sum(in_shard(path, (index, count)) for index in range(count)) == 1
+
+    # and the split is not degenerate
+    assert 0 < sum(in_shard(path, (0, 2)) for path in paths) < len(paths)
+
+
+@pytest.mark.parametrize("value", ["0", "-2", "two"])
+def test_concurrency_must_be_positive(value):
+    with pytest.raises(SystemExit):
+        build_parser().parse_args(["scan", "--output", "out.jsonl", "--concurrency", value])
+
+
+def test_load_checkpoint_is_per_config(tmp_path):
+    checkpoint = tmp_path / "out.jsonl.checkpoint"
+    checkpoint.write_text("aaa\tf/one.pdf\nbbb\tf/two.pdf\naaa\tf/three.pdf\nlegacy-line-without-config\n")
+
+    assert load_checkpoint(str(checkpoint), "aaa") == {"f/one.pdf", "f/three.pdf"}
+    assert load_checkpoint(str(checkpoint), "bbb") == {"f/two.pdf"}
+    assert load_checkpoint(str(checkpoint), "ccc") == set()
+    assert load_checkpoint(str(tmp_path / "missing"), "aaa") == set()
+
+
+def record(path, score, scanned_at, success=True, config="aaa"):
+    entry = {"storage_path": path, "scan_config": config, "success": success, "scanned_at": scanned_at}
+    if success:
+        entry["final_score"] = score
+    else:
+        entry["error"] = "boom"
+    return json.dumps(entry)
+
+
+def merge(tmp_path, *files, config=None):
+    inputs = []
+    for n, lines in enumerate(files):
+        path = tmp_path / f"results.{n}.jsonl"
+        path.write_text("\n".join(lines) + "\n")
+        inputs.append(str(path))
+    output = tmp_path / "ranking.jsonl"
+    code = run_merge(argparse.Namespace(inputs=inputs, output=str(output), top=None, config=config))
+    ranking = [json.loads(line) for line in output.read_text().splitlines()] if output.exists() else []
+    return code, ranking
+
+
+def test_merge_keeps_the_latest_successful_record(tmp_path):
+    code, ranking = merge(
+        tmp_path,
+        [record("a.pdf", 4, "2025-01-01T00:00:00"), record("b.pdf", 6, "2025-01-01T00:00:00")],
+        [record("a.pdf", 9, "2025-01-02T00:00:00"),
+         record("b.pdf", 0, "2025-01-03T00:00:00", success=False),
+         record("c.pdf", 0, "2025-01-03T00:00:00", success=False)],
+    )
+
+    assert code == 0
+    assert [(r["rank"], r["storage_path"], r["final_score"]) for r in ranking] == [(1, "a.pdf", 9), (2, "b.pdf", 6)]
+
+
+def test_merge_refuses_mixed_configs(tmp_path):
+    lines = [record("a.pdf", 4, "2025-01-01", config="aaa"), record("b.pdf", 6, "2025-01-01", config="bbb")]
+
+    code, ranking = merge(tmp_path, lines)
+    assert code == 2
+    assert ranking == []
+
+    code, ranking = merge(tmp_path, lines, config="bbb")
+    assert code == 0
+    assert [r["storage_path"] for r in ranking] == ["b.pdf"]
+
+
+def test_merge_skips_a_truncated_last_line(tmp_path):
+    complete = record("a.pdf", 7, "2025-01-01")
+    code, ranking = merge(tmp_path, [complete, record("b.pdf", 9, "2025-01-01")[:25]])
+
+    assert code == 0
+    assert [r["storage_path"] for r in ranking] == ["a.pdf"]
@@ -0,0 +1,169 @@
+import time
+
+import pytest
+
+from llm_resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LLMTimeoutError,
+    ResilientLLM,
+    StubChatModel,
+    StubProviderError,
+    is_transient,
+)
+
+
+def make_llm(stub, **kwargs):
+    kwargs.setdefault("hedge", False)
+    kwargs.setdefault("backoff_base", 0.01)
+    return ResilientLLM(stub, name="stub", **kwargs)
+
+
+def test_deadline_raises_timeout():
+    llm = make_llm(StubChatModel(latency=1.0), timeout=0.1, max_retries=0)
+
+    start = time.monotonic()
+    with pytest.raises(LLMTimeoutError):
+        llm.invoke("ping")
+
+    assert time.monotonic() - start < 0.5
+    assert llm.stats()["timeouts"] == 1
+
+
+def test_hedge_wins_over_slow_primary():
+    # five fast calls set p95, then the primary stalls and the hedge answers
+    stub = StubChatModel(latency=0.01, script=[0.01] * 5 + [2.0])
+    llm = make_llm(stub, hedge=True, hedge_min_samples=5, timeout=5)
+    for _ in range(5):
+        llm.invoke("ping")
+
+    start = time.monotonic()
+    response = llm.invoke("ping")
+
+    assert response.content == stub.content
+    assert time.monotonic() - start < 1.0
+    stats = llm.stats()
+    assert stats["hedges"] == 1
+    assert stats["hedge_wins"] == 1
+
+
+def test_transient_errors_are_retried():
+    stub = StubChatModel(latency=0.0, script=[StubProviderError(503), StubProviderError(502)])
+    llm = make_llm(stub, max_retries=2)
+
+    assert llm.invoke("ping").content == stub.content
+    assert stub.calls == 3
+    assert llm.stats()["retries"] == 2
+
+
+def test_backoff_is_jittered_and_capped():
+    llm = make_llm(StubChatModel(), backoff_base=0.5, backoff_max=2.0)
+
+    for attempt in range(6):
+        delays = [llm._backoff(attempt) for _ in range(200)]
+        assert all(0 <= d <= min(2.0, 0.5 * 2 ** attempt) for d in delays)
+        assert len(set(delays)) > 1
+
+
+@pytest.mark.parametrize("status", [400, 401, 422])
+def test_non_transient_errors_are_not_retried(status):
+    stub = StubChatModel(latency=0.0, script=[StubProviderError(status)])
+    llm = make_llm(stub, max_retries=2)
+
+    with pytest.raises(StubProviderError):
+        llm.invoke("ping")
+
+    assert stub.calls == 1
+    assert llm.stats()["retries"] == 0
+    assert llm.breaker.state == "closed"
+
+
+def test_is_transient():
+    assert is_transient(LLMTimeoutError())
+    assert is_transient(ConnectionError())
+    assert is_transient(StubProviderError(500))
+    assert is_transient(StubProviderError(429))
+    assert not is_transient(StubProviderError(401))
+    assert not is_transient(ValueError("bad schema"))
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    # only one trial call at a time
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_failed_trial_reopens_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_open_breaker_fails_fast():
+    stub = StubChatModel(latency=0.0, failure_rate=1.0)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    llm = make_llm(stub, max_retries=1, breaker=breaker)
+
+    with pytest.raises(StubProviderError):
+        llm.invoke("ping")
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        llm.invoke("ping")
+    assert stub.calls == 2
+    assert llm.stats()["circuit_rejections"] == 1
+
+
+def test_non_transient_trial_releases_half_open_breaker():
+    stub = StubChatModel(latency=0.0, script=[StubProviderError(503), StubProviderError(400)])
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    llm = make_llm(stub, max_retries=0, breaker=breaker)
+
+    with pytest.raises(StubProviderError):
+        llm.invoke("ping")
+    time.sleep(0.06)
+    with pytest.raises(StubProviderError):
+        llm.invoke("ping")
+
+    # the next call is let through as a new trial and closes the circuit
+    assert llm.invoke("ping").content == stub.content
+    assert breaker.state == "closed"
+
+
+def test_rate_limited_trial_releases_half_open_breaker():
+    # breaker opens, the half-open trial gets a 429, then the provider recovers
+    stub = StubChatModel(latency=0.0, script=[StubProviderError(503), StubProviderError(429)])
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    llm = make_llm(stub, max_retries=0, breaker=breaker)
+
+    with pytest.raises(StubProviderError):
+        llm.invoke("ping")
+    assert breaker.state == "open"
+    time.sleep(0.06)
+
+    with pytest.raises(StubProviderError):
+        llm.invoke("ping")
+    assert llm.stats()["rate_limited"] == 1
+    # a 429 says nothing about availability: still half-open, not stuck
+    assert breaker.state == "half_open"
+
+    assert llm.invoke("ping").content == stub.content
+    assert breaker.state == "closed"
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from llm_router import ModelRouter, load_routing_policy
+
+
+class FakeTier:
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+def parse(response):
+    return json.loads(response) if response.startswith("{") else None
+
+
+def answer(score):
+    return json.dumps({"score": score, "explanation": "ok"})
+
+
+def test_override_pattern_wins_over_default(monkeypatch):
+    monkeypatch.setenv("MODEL_ROUTING_POLICY", json.dumps({"skill_python*": {"tiers": ["large"]}}))
+    router = ModelRouter({"small": FakeTier(), "large": FakeTier()}, policy=load_routing_policy())
+
+    assert router.policy_for("skill_python_django") == {"tiers": ["large"]}
+    assert router.policy_for("skill_go")["tiers"] == ["small", "large"]
+
+
+def test_set_policy_takes_precedence():
+    router = ModelRouter({"small": FakeTier(), "large": FakeTier()},
+                         policy={"skill_*": {"tiers": ["small", "large"]}})
+    router.set_policy("skill_rust*", ["large"])
+
+    assert router.policy_for("skill_rust")["tiers"] == ["large"]
+
+
+def test_borderline_answer_escalates():
+    small, large = FakeTier(answer(5)), FakeTier(answer(9))
+    router = ModelRouter({"small": small, "large": large})
+
+    result, _ = router.invoke("skill_python", "prompt", parse)
+
+    assert result == {"score": 9, "explanation": "ok", "model_tier": "large"}
+    assert router.stats()["tiers"]["small"]["escalations"] == 1
+
+
+def test_failing_small_tier_escalates():
+    small, large = FakeTier(TimeoutError()), FakeTier(answer(8))
+    router = ModelRouter({"small": small, "large": large})
+
+    result, _ = router.invoke("culture_fit", "prompt", parse)
+
+    assert result["model_tier"] == "large"
+    tiers = router.stats()["tiers"]
+    assert tiers["small"]["errors"] == 1
+    assert tiers["small"]["escalations"] == 1
+
+
+def test_failing_last_tier_raises():
+    router = ModelRouter({"small": FakeTier(), "large": FakeTier(TimeoutError())})
+
+    with pytest.raises(TimeoutError):
+        router.invoke("experience_validation", "prompt", parse)
+    assert router.stats()["tiers"]["large"]["errors"] == 1
+
+
+def test_invoke_tier_is_counted():
+    router = ModelRouter({"small": FakeTier(), "large": FakeTier("nope", answer(7))})
+
+    assert router.invoke_tier("large", "prompt", parse) == (None, "nope")
+    result, _ = router.invoke_tier("large", "prompt", parse)
+
+    assert result["model_tier"] == "large"
+    stats = router.stats()
+    assert stats["total_calls"] == 2
+    assert stats["tiers"]["large"]["parse_failures"] == 1
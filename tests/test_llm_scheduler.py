@@ -0,0 +1,142 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from llm_scheduler import BATCH, INTERACTIVE, LLMScheduler, llm_priority, rate_limit_retry_after
+
+
+def make_scheduler(**kwargs):
+    kwargs.setdefault("tokens_per_minute", 60000)
+    kwargs.setdefault("requests_per_minute", 600)
+    kwargs.setdefault("interactive_reserve", 0.1)
+    kwargs.setdefault("quota_shares", 1)
+    return LLMScheduler("test", **kwargs)
+
+
+def wait_for_queue(scheduler, interactive=0, batch=0, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while scheduler.stats()["queue_depth"] != {"interactive": interactive, "batch": batch}:
+        assert time.monotonic() < deadline, scheduler.stats()["queue_depth"]
+        time.sleep(0.01)
+
+
+def test_interactive_goes_ahead_of_batch():
+    # 6 requests/minute: once drained, the next request slot is 10s away
+    scheduler = make_scheduler(requests_per_minute=6, interactive_reserve=0.0)
+    scheduler._keys[0].requests.level = 0.0
+
+    granted = []
+    batch = threading.Thread(target=lambda: granted.append(("batch", scheduler.acquire(100, BATCH))), daemon=True)
+    batch.start()
+    wait_for_queue(scheduler, batch=1)
+    interactive = threading.Thread(target=lambda: granted.append(("interactive", scheduler.acquire(100, INTERACTIVE))))
+    interactive.start()
+    wait_for_queue(scheduler, interactive=1, batch=1)
+
+    # room for exactly one request: it must go to the interactive call that came second
+    with scheduler._cond:
+        scheduler._keys[0].requests.level = 1.0
+        scheduler._cond.notify_all()
+    interactive.join(timeout=2)
+
+    assert granted == [("interactive", 0)]
+    wait_for_queue(scheduler, batch=1)
+
+
+def test_fifo_within_a_priority_class():
+    scheduler = make_scheduler(requests_per_minute=6, interactive_reserve=0.0)
+    scheduler._keys[0].requests.level = 0.0
+
+    granted = []
+    first = threading.Thread(target=lambda: granted.append(("first", scheduler.acquire(100, BATCH))))
+    first.start()
+    wait_for_queue(scheduler, batch=1)
+    second = threading.Thread(target=lambda: granted.append(("second", scheduler.acquire(100, BATCH))), daemon=True)
+    second.start()
+    wait_for_queue(scheduler, batch=2)
+
+    with scheduler._cond:
+        scheduler._keys[0].requests.level = 1.0
+        scheduler._cond.notify_all()
+    first.join(timeout=2)
+
+    assert granted == [("first", 0)]
+    wait_for_queue(scheduler, batch=1)
+
+
+def test_batch_leaves_the_interactive_reserve():
+    scheduler = make_scheduler(tokens_per_minute=1000, interactive_reserve=0.1)
+    # 150 tokens left: enough for a 100-token call, but not for one plus the 100-token reserve
+    scheduler._keys[0].tokens.level = 150.0
+
+    assert scheduler.try_acquire(100, BATCH) is None
+    assert scheduler.try_acquire(100, INTERACTIVE) == 0
+
+
+def test_priority_defaults_to_the_context():
+    scheduler = make_scheduler(tokens_per_minute=1000, interactive_reserve=0.1)
+    scheduler._keys[0].tokens.level = 150.0
+
+    with llm_priority(BATCH):
+        assert scheduler.try_acquire(100) is None
+    assert scheduler.try_acquire(100) == 0
+
+
+def test_penalize_blocks_the_key_for_retry_after():
+    scheduler = make_scheduler()
+    scheduler.penalize(0, retry_after=30)
+
+    key_stats = scheduler.stats()["keys"][0]
+    assert key_stats["rate_limited"] == 1
+    assert key_stats["tokens_available"] <= 0
+    assert scheduler.try_acquire(100, INTERACTIVE) is None
+    _, wait = scheduler._best_key(100, INTERACTIVE, time.monotonic())
+    assert 29 < wait <= 30
+
+
+def test_penalized_key_is_skipped_for_another_key():
+    scheduler = make_scheduler(n_keys=2)
+    scheduler.penalize(0, retry_after=30)
+
+    assert scheduler.try_acquire(100, INTERACTIVE) == 1
+
+
+def test_best_key_is_the_one_that_can_serve_soonest():
+    scheduler = make_scheduler(n_keys=3, tokens_per_minute=6000, interactive_reserve=0.0)
+    now = time.monotonic()
+    for quota, level in zip(scheduler._keys, [0.0, 400.0, 200.0]):
+        quota.tokens.level = level
+        quota.tokens.updated = now
+
+    # nobody has 1000 tokens; key 1 gets there first (600 short at 100 tokens/s)
+    key, wait = scheduler._best_key(1000, INTERACTIVE, now)
+    assert key == 1
+    assert wait == pytest.approx(6.0)
+
+    # key 1 can serve a small call right away
+    assert scheduler._best_key(300, INTERACTIVE, now) == (1, 0.0)
+
+
+def test_set_quota_shares_resplits_the_limits():
+    scheduler = make_scheduler(tokens_per_minute=6000, requests_per_minute=30)
+    scheduler.set_quota_shares(3)
+
+    stats = scheduler.stats()
+    assert stats["quota_shares"] == 3
+    assert stats["tokens_per_minute"] == 2000
+    assert stats["requests_per_minute"] == 10
+    assert scheduler._keys[0].tokens.capacity == 2000
+    assert scheduler._keys[0].tokens.level <= 2000
+
+    scheduler.set_quota_shares(0)
+    assert scheduler.stats()["quota_shares"] == 1
+
+
+def test_rate_limit_retry_after():
+    response = SimpleNamespace(status_code=429, headers={"retry-after": "12"})
+
+    assert rate_limit_retry_after(SimpleNamespace(response=response)) == 12.0
+    assert rate_limit_retry_after(SimpleNamespace(status_code=429, response=None)) == 0.0
+    assert rate_limit_retry_after(SimpleNamespace(status_code=500, response=None)) is None
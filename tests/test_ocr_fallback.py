@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+
+import pytest
+
+import ocr_fallback
+
+
+# Stand-ins for the Tesseract worker; module level so the pool can pickle them
+def fake_ocr_page_images(images, timeout):
+    if images[0] == b"hang":
+        time.sleep(3600)
+    if images[0] == b"slow":
+        time.sleep(1.5)
+    return images[0].decode()
+
+
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    monkeypatch.setattr(ocr_fallback, "_ocr_page_images", fake_ocr_page_images)
+    monkeypatch.setattr(ocr_fallback, "OCR_MAX_WORKERS", 2)
+    monkeypatch.setattr(ocr_fallback, "_slots", threading.BoundedSemaphore(2))
+    monkeypatch.setattr(ocr_fallback, "_pool", None)
+    monkeypatch.setattr(ocr_fallback, "OCR_CACHE_DIR", "")
+    monkeypatch.setattr(ocr_fallback, "OCR_DEADLINE_GRACE", 0.2)
+    ocr_fallback._memory_cache.clear()
+    yield
+    if ocr_fallback._pool is not None:
+        ocr_fallback._reset_pool(ocr_fallback._pool)
+    ocr_fallback._memory_cache.clear()
+
+
+def test_pages_are_ocrd_and_cached(fake_ocr):
+    assert ocr_fallback.ocr_pages({0: [b"one"], 1: [b"two"], 2: []}) == {0: "one", 1: "two", 2: ""}
+    assert ocr_fallback._cache_get(ocr_fallback.page_content_hash([b"one"])) == "one"
+
+
+def test_hung_page_comes_back_empty(fake_ocr):
+    start = time.monotonic()
+    assert ocr_fallback.ocr_pages({0: [b"hang"], 1: [b"fine"]}, page_timeout=0.5) == {0: "", 1: "fine"}
+    assert time.monotonic() - start < 5
+
+
+def test_other_callers_pages_survive_a_pool_reset(fake_ocr):
+    # caller B's page is running when caller A's page hangs and the pool is killed
+    slow_result = {}
+    slow_caller = threading.Thread(
+        target=lambda: slow_result.update(ocr_fallback.ocr_pages({0: [b"slow"]}, page_timeout=5))
+    )
+    slow_caller.start()
+    time.sleep(0.3)
+
+    assert ocr_fallback.ocr_pages({0: [b"hang"]}, page_timeout=0.5) == {0: ""}
+    slow_caller.join(timeout=10)
+
+    assert slow_result == {0: "slow"}
+
+
+def test_budget_leaves_unfinished_pages_empty(fake_ocr):
+    start = time.monotonic()
+    assert ocr_fallback.ocr_pages({0: [b"slow"]}, page_timeout=5, budget=0.3) == {0: ""}
+    assert time.monotonic() - start < 1.0
+
+
+def test_disk_cache_is_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr_fallback, "OCR_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(ocr_fallback, "OCR_CACHE_MAX_FILES", 3)
+    monkeypatch.setattr(ocr_fallback, "OCR_CACHE_PRUNE_EVERY", 1)
+    monkeypatch.setattr(ocr_fallback, "_memory_cache", ocr_fallback.OrderedDict())
+    stale = tmp_path / "stale.txt"
+    stale.write_text("old")
+    old = time.time() - ocr_fallback.OCR_CACHE_TTL - 60
+    os.utime(stale, (old, old))
+
+    for n in range(5):
+        ocr_fallback._cache_put(f"page{n}", str(n))
+        # distinct mtimes so the newest files are the ones kept
+        os.utime(tmp_path / f"page{n}.txt", (time.time() + n, time.time() + n))
+    ocr_fallback._prune_cache()
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["page2.txt", "page3.txt", "page4.txt"]
+
+
+def test_memory_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(ocr_fallback, "OCR_CACHE_DIR", "")
+    monkeypatch.setattr(ocr_fallback, "OCR_MEMORY_CACHE_SIZE", 2)
+    monkeypatch.setattr(ocr_fallback, "_memory_cache", ocr_fallback.OrderedDict())
+
+    ocr_fallback._cache_put("a", "A")
+    ocr_fallback._cache_put("b", "B")
+    assert ocr_fallback._cache_get("a") == "A"
+    ocr_fallback._cache_put("c", "C")
+
+    assert list(ocr_fallback._memory_cache) == ["a", "c"]
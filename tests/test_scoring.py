@@ -0,0 +1,98 @@
+import math
+
+import pytest
+
+from scoring import rerank, resolve_weight, validate_weights, weighted_score
+
+BREAKDOWNS = [
+    {"skill_python": 8, "skill_sql": 5, "experience_validation": 7, "jd_match": 6},
+    {"skill_python": 3, "experience_validation": 9, "culture_fit": 4},
+    {"skill_python": 10, "skill_sql": 10, "experience_validation": 2, "jd_match": 9, "culture_fit": 7},
+]
+
+
+def plain_mean(breakdown):
+    return round(sum(breakdown.values()) / len(breakdown), 2)
+
+
+@pytest.mark.parametrize("weights", [None, {}, {"*": 1}])
+def test_all_ones_weights_give_the_plain_average(weights):
+    scores, _ = rerank(BREAKDOWNS, weights)
+
+    assert list(scores) == [plain_mean(b) for b in BREAKDOWNS]
+    assert [weighted_score(b, weights) for b in BREAKDOWNS] == [plain_mean(b) for b in BREAKDOWNS]
+
+
+def test_aggregator_parity():
+    pipeline = pytest.importorskip("langgraph_pipeline")
+
+    for breakdown in BREAKDOWNS:
+        state = {"agent_outputs": {name: {"score": score} for name, score in breakdown.items()}}
+        result = pipeline.aggregator_agent(state, weights={})
+        assert result["final_score"] == rerank([breakdown], {})[0][0]
+
+
+def test_rerank_matches_weighted_score():
+    weights = validate_weights({"jd_match": 3, "skill_*": 0.5, "culture_fit": 0})
+    scores, order = rerank(BREAKDOWNS, weights)
+
+    assert list(scores) == [weighted_score(b, weights) for b in BREAKDOWNS]
+    assert list(order) == sorted(range(len(BREAKDOWNS)), key=lambda i: -scores[i])
+
+
+def test_missing_agents_are_averaged_over_those_present():
+    # the second candidate has no jd_match: its heavy weight must not drag it down
+    weights = {"jd_match": 10}
+    scores, _ = rerank([{"skill_python": 6, "jd_match": 6}, {"skill_python": 6}], weights)
+
+    assert list(scores) == [6.0, 6.0]
+
+
+def test_excluded_candidates_rank_last():
+    scores, order = rerank(BREAKDOWNS + [{"skill_python": 10}], None, excluded=[False, False, False, True])
+
+    assert scores[3] == 0
+    assert order[-1] == 3
+    assert list(order[:3]) == sorted(range(3), key=lambda i: -scores[i])
+
+
+def test_excluded_candidates_keep_input_order_among_themselves():
+    scores, order = rerank([{}, {"a": 9}, {}], None, excluded=[True, False, True])
+
+    assert list(order) == [1, 0, 2]
+
+
+def test_resolve_weight_precedence():
+    weights = {"skill_python": 2, "skill_*": 0.5, "*": 3}
+
+    assert resolve_weight("skill_python", weights) == 2
+    assert resolve_weight("skill_sql", weights) == 0.5
+    assert resolve_weight("jd_match", weights) == 3
+    assert resolve_weight("jd_match", None) == 1.0
+
+
+@pytest.mark.parametrize("weights", [
+    {"jd_match": 0, "*": 0},
+    {"*": 0},
+])
+def test_all_zero_weights_are_rejected(weights):
+    with pytest.raises(ValueError, match="all zero"):
+        validate_weights(weights)
+
+
+@pytest.mark.parametrize("weights", [
+    [1, 2],
+    {"jd_match": -1},
+    {"jd_match": math.inf},
+    {"jd_match": math.nan},
+    {"jd_match": "2"},
+    {"jd_match": True},
+])
+def test_invalid_weights_are_rejected(weights):
+    with pytest.raises(ValueError):
+        validate_weights(weights)
+
+
+def test_zero_weight_for_some_agents_is_allowed():
+    assert validate_weights({"culture_fit": 0}) == {"culture_fit": 0.0}
+    assert validate_weights(None) is None
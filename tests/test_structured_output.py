@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import pytest
+
+from structured_output import AgentScore, parse_agent_response, parse_stats, repair_json
+
+
+def recorded(call):
+    """Result of call() and the parse paths it recorded."""
+    before = parse_stats.snapshot()
+    result = call()
+    after = parse_stats.snapshot()
+    return result, {path: after[path] - before[path] for path in after if after[path] != before[path]}
+
+
+@pytest.mark.parametrize("text", [
+    '```json\n{"score": 7, "explanation": "Solid."}\n```',
+    'Here you go: {"score": 7, "explanation": "Solid."} Hope that helps.',
+    '{"score": 7, "explanation": "Solid.",}',
+    "{'score': 7, 'explanation': 'Solid.'}",
+])
+def test_repair_json_recovers_malformed_replies(text):
+    assert repair_json(text) == {"score": 7, "explanation": "Solid."}
+
+
+def test_repair_json_fills_missing_explanation():
+    result = repair_json('{"score": 6}')
+
+    assert result["score"] == 6
+    assert result["explanation"]
+
+
+@pytest.mark.parametrize("text", [
+    '{"score": 11, "explanation": "Too high."}',
+    '{"score": -1, "explanation": "Too low."}',
+    "I cannot evaluate this resume.",
+    "",
+])
+def test_repair_json_rejects_unusable_replies(text):
+    assert repair_json(text) is None
+
+
+def test_structured_reply():
+    result, paths = recorded(lambda: parse_agent_response(
+        {"parsed": AgentScore(score=8, explanation="Good."), "raw": None}
+    ))
+
+    assert result == {"score": 8, "explanation": "Good."}
+    assert paths == {"structured": 1}
+
+
+def test_direct_reply():
+    message = SimpleNamespace(content='{"score": 4, "explanation": "Some."}')
+    result, paths = recorded(lambda: parse_agent_response(message))
+
+    assert result == {"score": 4, "explanation": "Some."}
+    assert paths == {"direct": 1}
+
+
+def test_repaired_reply():
+    message = SimpleNamespace(content='```\n{"score": 3, "explanation": "Little.",}\n```')
+    result, paths = recorded(lambda: parse_agent_response(message))
+
+    assert result == {"score": 3, "explanation": "Little."}
+    assert paths == {"repaired": 1}
+
+
+def test_invalid_structured_reply_falls_back_to_raw_text():
+    raw = SimpleNamespace(content='{"score": 5, "explanation": "Fallback."}')
+    result, paths = recorded(lambda: parse_agent_response({"parsed": None, "raw": raw}))
+
+    assert result == {"score": 5, "explanation": "Fallback."}
+    assert paths == {"direct": 1}
+
+
+def test_tool_call_arguments_are_parsed():
+    message = SimpleNamespace(content="", additional_kwargs={"tool_calls": [
+        {"function": {"arguments": '{"score": 9, "explanation": "Great."}'}}
+    ]})
+    result, paths = recorded(lambda: parse_agent_response(message))
+
+    assert result == {"score": 9, "explanation": "Great."}
+    assert paths == {"direct": 1}
+
+
+def test_out_of_range_reply_is_unparsed():
+    message = SimpleNamespace(content='{"score": 12, "explanation": "Off the scale."}')
+    result, paths = recorded(lambda: parse_agent_response(message))
+
+    assert result is None
+    assert paths == {"unparsed": 1}